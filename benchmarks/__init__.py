@@ -0,0 +1,29 @@
+"""
+pymorph benchmarks
+==================
+
+Times the operators of pymorph on deterministic synthetic images, at
+several sizes, and compares the timings of two runs::
+
+    python -m benchmarks run -o before.json
+    (change pymorph)
+    python -m benchmarks run -o after.json
+    python -m benchmarks compare before.json after.json
+
+`python -m benchmarks run -h` and `python -m benchmarks compare -h` list
+the options (sizes, repetitions, selection of the tasks, threshold for a
+regression).
+
+- `images()`   : The synthetic images of a given size.
+- `tasks()`    : The benchmark tasks.
+- `run()`      : Time the tasks.
+- `save()`     : Write results as JSON.
+- `load()`     : Read results written by `save()`.
+- `compare()`  : Compare two results.
+- `report()`   : Print a comparison.
+"""
+from images import images
+from suite import tasks, run, save, load
+from compare import compare, report
+
+__all__ = ['images', 'tasks', 'run', 'save', 'load', 'compare', 'report']
@@ -0,0 +1,42 @@
+"""
+Command line interface of the benchmarks: ``python -m benchmarks``
+"""
+import sys
+import argparse
+
+from suite import run, save, load
+from compare import compare, report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='pymorph benchmarks')
+    commands = parser.add_subparsers(dest='command')
+
+    p = commands.add_parser('run', help='time the operators')
+    p.add_argument('-o', '--output', help='JSON file for the results (default: print them only)')
+    p.add_argument('-s', '--sizes', default='128,512', help='comma separated image sizes (default: 128,512)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='timed calls of each task (default: 5)')
+    p.add_argument('-w', '--warmup', type=int, default=1, help='untimed calls before (default: 1)')
+    p.add_argument('-b', '--budget', type=float, default=10., help='seconds after which a task is not repeated (default: 10)')
+    p.add_argument('-k', '--pattern', help='only the tasks whose name matches this regular expression')
+    p.add_argument('--seed', type=int, default=0, help='seed of the synthetic images (default: 0)')
+
+    p = commands.add_parser('compare', help='compare two runs')
+    p.add_argument('old', help='JSON results of the reference run')
+    p.add_argument('new', help='JSON results of the run to check')
+    p.add_argument('-t', '--threshold', type=float, default=.1, help='significant relative change (default: 0.1)')
+    p.add_argument('--stat', default='min', choices=('min', 'median', 'mean'), help='statistic compared (default: min)')
+    p.add_argument('--min-delta', type=float, default=5e-4, help='significant change, in seconds (default: 0.0005)')
+    p.add_argument('-a', '--all', action='store_true', help='also list the tasks that did not change')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        sizes = [int(s) for s in args.sizes.split(',')]
+        results = run(sizes, args.repeat, args.warmup, args.pattern, args.budget, args.seed, log=sys.stdout)
+        if args.output:
+            save(results, args.output)
+        return 0
+    rows = compare(load(args.old), load(args.new), args.threshold, args.stat, args.min_delta)
+    return (1 if report(rows, all=args.all) else 0)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Comparison of two benchmark runs
+"""
+import sys
+
+def compare(old, new, threshold=.1, stat='min', min_delta=5e-4):
+    """
+    rows = compare(old, new, threshold=.1, stat='min', min_delta=5e-4)
+
+    Compare the timings of two runs (as returned by `run` or `load`).
+
+    A task is a 'regression' if its time (the statistic `stat` of its
+    timings) grew by more than a fraction `threshold` and by more than
+    `min_delta` seconds (which hides the noise of very short tasks), and
+    an 'improvement' if it shrank by as much. The other statuses are 'ok',
+    'error' (the new run failed), 'fixed' (the old run failed), 'new' and
+    'missing'.
+
+    Parameters
+    ----------
+    old :       Results of the reference run.
+    new :       Results of the run to check.
+    threshold : Relative change of time that is significant (default: 10%).
+    stat :      {'min' [default], 'median', 'mean'}
+    min_delta : Smallest significant change of time, in seconds
+                (default: 0.5ms).
+
+    Returns
+    -------
+    rows : list of ``(key, old time, new time, ratio, status)``, sorted by
+           key (times are None for missing or failed tasks)
+    """
+    old = old['results']
+    new = new['results']
+    rows = []
+    for key in sorted(set(old) | set(new)):
+        a = old.get(key)
+        b = new.get(key)
+        ta = (a.get(stat) if a is not None else None)
+        tb = (b.get(stat) if b is not None else None)
+        ratio = None
+        if a is None:
+            status = 'new'
+        elif b is None:
+            status = 'missing'
+        elif tb is None:
+            status = ('error' if ta is not None else 'ok')
+        elif ta is None:
+            status = 'fixed'
+        else:
+            ratio = tb / ta if ta > 0 else float('inf')
+            status = 'ok'
+            if abs(tb - ta) > min_delta:
+                if tb > ta * (1. + threshold):
+                    status = 'regression'
+                elif tb * (1. + threshold) < ta:
+                    status = 'improvement'
+        rows.append((key, ta, tb, ratio, status))
+    return rows
+
+
+def report(rows, out=None, all=False):
+    """
+    nregressions = report(rows, out=sys.stdout, all=False)
+
+    Print the `rows` of `compare` (only those which are not 'ok', unless
+    `all`) to `out`, and return the number of regressions and errors.
+    """
+    if out is None: out = sys.stdout
+    def fmt(t):
+        return ('%10.6f' % t if t is not None else '%10s' % '-')
+    print >>out, '%-28s %10s %10s %8s  %s' % ('task', 'old (s)', 'new (s)', 'new/old', 'status')
+    bad = 0
+    for key, ta, tb, ratio, status in rows:
+        if status in ('regression', 'error'):
+            bad += 1
+        if status == 'ok' and not all:
+            continue
+        print >>out, '%-28s %s %s %8s  %s' % (key, fmt(ta), fmt(tb), ('%.2f' % ratio if ratio is not None else '-'), status)
+    counts = {}
+    for row in rows:
+        counts[row[-1]] = counts.get(row[-1], 0) + 1
+    print >>out, ', '.join('%d %s' % (n, status) for status, n in sorted(counts.items()))
+    return bad
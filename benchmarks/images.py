@@ -0,0 +1,122 @@
+"""
+Synthetic benchmark images
+
+Every image is computed from a fixed seed, so that a given size (and seed)
+always gives the same pixels, on any machine.
+"""
+import numpy as np
+import pymorph
+
+def _smooth(x, k):
+    """
+    y = _smooth(x, k)
+
+    Mean of `x` over the k x k squares (clipped at the border).
+    """
+    h,w = x.shape
+    c = np.zeros((h+1,w+1))
+    c[1:,1:] = x.cumsum(0).cumsum(1)
+    r0 = np.clip(np.arange(h) - k//2, 0, h)
+    r1 = np.clip(np.arange(h) - k//2 + k, 0, h)
+    c0 = np.clip(np.arange(w) - k//2, 0, w)
+    c1 = np.clip(np.arange(w) - k//2 + k, 0, w)
+    s = c[r1][:,c1] - c[r0][:,c1] - c[r1][:,c0] + c[r0][:,c0]
+    return s / ((r1-r0)[:,np.newaxis] * (c1-c0))
+
+
+def noise(size, seed=0):
+    """
+    f = noise(size, seed=0)
+
+    Uniform uint8 noise of `size` x `size` pixels.
+    """
+    r = np.random.RandomState(seed)
+    return r.randint(0, 256, (size,size)).astype(np.uint8)
+
+
+def cells(size, seed=0):
+    """
+    f = cells(size, seed=0)
+
+    uint8 image of `size` x `size` pixels made of bright smooth bumps (about
+    12 pixels wide) on a darker background, with a little noise.
+    """
+    r = np.random.RandomState(seed)
+    x = _smooth(_smooth(r.rand(size,size), 9), 9)
+    x = (x - x.min()) / max(x.max() - x.min(), 1e-12)
+    x = 230*x + 25*r.rand(size,size)
+    return x.astype(np.uint8)
+
+
+def blobs(size, seed=0):
+    """
+    f = blobs(size, seed=0)
+
+    Binary image of `size` x `size` pixels with irregular blobs, about 40%
+    of the pixels.
+    """
+    f = cells(size, seed).astype(float)
+    return f > np.percentile(f, 60)
+
+
+def gradient(size):
+    """
+    f = gradient(size)
+
+    uint8 diagonal ramp of `size` x `size` pixels, from 0 to 255.
+    """
+    i = np.arange(size)
+    return ((i[:,np.newaxis] + i) * 255 // max(2*size-2, 1)).astype(np.uint8)
+
+
+def text(size, txt='pymorph'):
+    """
+    f = text(size, txt='pymorph')
+
+    Binary image of `size` x `size` pixels covered by lines of `txt` (as
+    drawn by `pymorph.text`).
+    """
+    t = pymorph.text(txt)
+    th,tw = t.shape
+    f = np.zeros((size,size), bool)
+    for k,r in enumerate(xrange(0, size, th+2)):
+        line = np.roll(np.tile(t, (1, size//tw + 2)), -3*k, 1)
+        f[r:r+th] = line[:size-r,:size]
+    return f
+
+
+def images(size, seed=0):
+    """
+    I = images(size, seed=0)
+
+    The benchmark images of `size` x `size` pixels, by name:
+
+    - 'binary':   `blobs`.
+    - 'text':     `text`.
+    - 'gray':     `cells`.
+    - 'noise':    `noise`.
+    - 'gradient': `gradient`.
+
+    and images computed from them (seeds for reconstructions, labels,
+    skeletons, the morphological skeleton ('skelm') and distance transform
+    ('distance') of 'binary', markers, a stack of 32x32 patches), so that
+    the tasks do not spend time preparing their input.
+    """
+    I = {
+        'binary': blobs(size, seed),
+        'text': text(size),
+        'gray': cells(size, seed),
+        'noise': noise(size, seed+1),
+        'gradient': gradient(size),
+    }
+    I['seeds'] = I['binary'] & (I['noise'] > 250)
+    I['labels'] = pymorph.label(I['binary'])
+    I['skeleton'] = pymorph.thin(I['binary'])
+    I['skelm'] = pymorph.skelm(I['binary'], return_binary=False)
+    I['distance'] = pymorph.dist(I['binary'])
+    I['markers'] = pymorph.regmin(I['gray'], pymorph.sebox())
+    I['gray_lower'] = pymorph.subm(I['gray'], 40)
+    I['gray_upper'] = pymorph.addm(I['gray'], 40)
+    n = size//32
+    I['patches'] = I['gray'][:32*n,:32*n].reshape((n,32,n,32)).swapaxes(1,2).reshape((n*n,32,32))
+    return I
@@ -0,0 +1,235 @@
+"""
+Benchmark tasks and timing
+
+A task is a name (``operator/input``) and a function of the images of
+`images.images`. `run` times every task at every size: a few warm-up
+calls, then `repeat` timed calls (fewer if they take longer than `budget`
+seconds), each one timed separately.
+"""
+import re
+import sys
+import json
+import time
+import platform
+from timeit import default_timer
+
+import numpy as np
+import pymorph as pm
+from images import images
+
+def _cold(function, *args):
+    """
+    y = _cold(function, *args)
+
+    ``function(*args)`` with an empty cache of structuring elements, so
+    that the structuring element builders are timed, not the cache.
+    """
+    pm.mmorph._se_cache.clear()
+    return function(*args)
+
+
+def tasks():
+    """
+    T = tasks()
+
+    The benchmark tasks: list of ``(name, function)`` pairs, where
+    `function` is called with the dictionary of images of `images`.
+    """
+    # non-flat 3x3 structuring element of the original benchmark
+    nonflat = pm.img2se(pm.binary([[0,1,0],[1,1,1],[0,1,0]]), 'NON-FLAT', pm.to_int32([[0,1,0],[1,2,1],[0,1,0]]))
+    return [
+        ('union/binary',        lambda I: pm.union(I['binary'], I['text'])),
+        ('union/gray',          lambda I: pm.union(I['gray'], I['noise'])),
+        ('intersec/gray',       lambda I: pm.intersec(I['gray'], I['noise'], I['gradient'])),
+        ('neg/gray',            lambda I: pm.neg(I['gray'])),
+        ('addm/gray',           lambda I: pm.addm(I['gray'], I['noise'])),
+        ('subm/gray',           lambda I: pm.subm(I['gray'], I['noise'])),
+        ('symdiff/binary',      lambda I: pm.symdiff(I['binary'], I['text'])),
+        ('threshad/gray',       lambda I: pm.threshad(I['gray'], 100, 200)),
+        ('toggle/gray',         lambda I: pm.toggle(I['noise'], I['gray_lower'], I['gray_upper'])),
+        ('add4dilate/gray',     lambda I: pm.add4dilate(I['gray'], 40)),
+        ('add4dilate/uint16',   lambda I: pm.add4dilate(I['distance'], 7)),
+        ('histogram/gray',      lambda I: pm.histogram(I['gray'])),
+        ('gray/binary',         lambda I: pm.gray(I['binary'], 'uint16')),
+        ('sedisk/euclidean',    lambda I: _cold(pm.sedisk, 25)),
+        ('sedisk/octagon',      lambda I: _cold(pm.sedisk, 25, 2, 'octagon')),
+        ('seline/30',           lambda I: _cold(pm.seline, 51, 30)),
+        ('sesum/cross',         lambda I: _cold(pm.sesum, pm.secross(), 25)),
+        ('dilate/binary',       lambda I: pm.dilate(I['binary'])),
+        ('dilate/gray',         lambda I: pm.dilate(I['gray'])),
+        ('dilate/gray-disk5',   lambda I: pm.dilate(I['gray'], pm.sedisk(5))),
+        ('dilate/gray-nonflat', lambda I: pm.dilate(I['gray'], nonflat)),
+        ('dilate/stack',        lambda I: pm.dilate(I['patches'], pm.sebox())),
+        ('erode/binary',        lambda I: pm.erode(I['binary'])),
+        ('erode/gray',          lambda I: pm.erode(I['gray'])),
+        ('erode/gray-line',     lambda I: pm.erode(I['gray'], pm.seline(15, 30) > 0)),
+        ('open/binary',         lambda I: pm.open(I['binary'])),
+        ('open/gray',           lambda I: pm.open(I['gray'])),
+        ('open/gray-nonflat',   lambda I: pm.open(I['gray'], nonflat)),
+        ('close/binary',        lambda I: pm.close(I['binary'], pm.sedisk(3))),
+        ('close/gray',          lambda I: pm.close(I['gray'])),
+        ('openth/gray',         lambda I: pm.openth(I['gray'], pm.sebox(3))),
+        ('closeth/gray',        lambda I: pm.closeth(I['gray'], pm.sebox(3))),
+        ('gradm/gray',          lambda I: pm.gradm(I['gray'])),
+        ('asf/gray',            lambda I: pm.asf(I['gray'], 'OC', pm.secross(), 3)),
+        ('tiled/open-gray',     lambda I: pm.tiled(pm.open, I['gray'], (pm.sedisk(3),), tile=256)),
+        ('infrec/gray',         lambda I: pm.infrec(I['gray_lower'], I['gray'])),
+        ('suprec/gray',         lambda I: pm.suprec(I['gray_upper'], I['gray'])),
+        ('openrec/gray',        lambda I: pm.openrec(I['gray'], pm.sebox(2))),
+        ('closerec/gray',       lambda I: pm.closerec(I['gray'], pm.sebox(2))),
+        ('openrecth/gray',      lambda I: pm.openrecth(I['gray'], pm.sebox(2))),
+        ('closerecth/gray',     lambda I: pm.closerecth(I['gray'], pm.sebox(2))),
+        ('asfrec/gray',         lambda I: pm.asfrec(I['gray'])),
+        ('cdilate/binary',      lambda I: pm.cdilate(I['seeds'], I['binary'], None, 10)),
+        ('cerode/binary',       lambda I: pm.cerode(I['binary'], I['seeds'], None, 10)),
+        ('close_holes/binary',  lambda I: pm.close_holes(I['text'])),
+        ('edgeoff/binary',      lambda I: pm.edgeoff(I['binary'])),
+        ('dist/binary',         lambda I: pm.dist(I['binary'])),
+        ('dist/binary-cross',   lambda I: pm.dist(I['binary'], pm.secross(), 'city-block')),
+        ('cdist/binary',        lambda I: pm.cdist(I['seeds'], I['binary'])),
+        ('gdist/binary',        lambda I: pm.gdist(I['binary'], I['seeds'])),
+        ('areaopen/binary',     lambda I: pm.areaopen(I['binary'], 100)),
+        ('areaopen/gray',       lambda I: pm.areaopen(I['gray'], 100)),
+        ('areaclose/gray',      lambda I: pm.areaclose(I['gray'], 100)),
+        ('label/binary',        lambda I: pm.label(I['binary'])),
+        ('label/stack',         lambda I: pm.label(I['patches'] > 128)),
+        ('labelflat/gray',      lambda I: pm.labelflat(I['gray'])),
+        ('blob/area',           lambda I: pm.blob(I['labels'], 'area')),
+        ('blob/boundingbox',    lambda I: pm.blob(I['labels'], 'boundingbox', 'data')),
+        ('grain/mean',          lambda I: pm.grain(I['gray'], I['labels'], 'mean', 'data')),
+        ('grain/median',        lambda I: pm.grain(I['gray'], I['labels'], 'median', 'data')),
+        ('flood/area',          lambda I: pm.flood(I['gray'], 100, 'AREA')),
+        ('flood/h',             lambda I: pm.flood(I['gray'], 10, 'H')),
+        ('flood/volume',        lambda I: pm.flood(I['gray'], 1000, 'VOLUME')),
+        ('regmax/gray',         lambda I: pm.regmax(I['gray'])),
+        ('regmin/gray',         lambda I: pm.regmin(I['gray'])),
+        ('hmin/gray',           lambda I: pm.hmin(I['gray'], 10)),
+        ('hmax/gray',           lambda I: pm.hmax(I['gray'], 10)),
+        ('inpos/gray',          lambda I: pm.inpos(I['markers'], I['gray'])),
+        ('watershed/gray',      lambda I: pm.watershed(I['gray'])),
+        ('cwatershed/gray',     lambda I: pm.cwatershed(I['gray'], I['markers'])),
+        ('skiz/binary',         lambda I: pm.skiz(I['seeds'])),
+        ('thin/binary',         lambda I: pm.thin(I['binary'])),
+        ('thick/binary',        lambda I: pm.thick(I['text'], None, 10)),
+        ('cthin/binary',        lambda I: pm.cthin(I['binary'], I['skeleton'])),
+        ('cthick/binary',       lambda I: pm.cthick(I['seeds'], I['binary'])),
+        ('thin/endpoints',      lambda I: pm.thin(I['skeleton'], pm.endpoints(), 10)),
+        ('homothick/interval',  lambda I: _cold(pm.homothick)),
+        ('supgen/binary',       lambda I: pm.supgen(I['skeleton'], pm.endpoints())),
+        ('infgen/binary',       lambda I: pm.infgen(I['skeleton'], pm.endpoints())),
+        ('supcanon/binary',     lambda I: pm.supcanon(I['skeleton'], pm.endpoints())),
+        ('infcanon/binary',     lambda I: pm.infcanon(I['binary'], pm.homothin())),
+        ('skelm/binary',        lambda I: pm.skelm(I['binary'])),
+        ('skelmrec/binary',     lambda I: pm.skelmrec(I['skelm'])),
+        ('cbisector/binary',    lambda I: pm.cbisector(I['binary'], pm.secross(), 2)),
+        ('opentransf/binary',   lambda I: pm.opentransf(I['binary'])),
+        ('patspec/binary',      lambda I: pm.patspec(I['binary'])),
+        ('lastero/binary',      lambda I: pm.lastero(I['binary'])),
+        ('isolines/dist',       lambda I: pm.isolines(I['distance'])),
+        ('center/binary',       lambda I: pm.center(I['text'])),
+    ]
+
+
+def _time(function, I, repeat, warmup, budget):
+    """
+    times = _time(function, I, repeat, warmup, budget)
+
+    Times of `repeat` calls of ``function(I)`` (only as many as fit in
+    `budget` seconds, but at least one), after `warmup` calls.
+    """
+    for i in xrange(warmup):
+        function(I)
+    times = []
+    start = default_timer()
+    while len(times) < repeat:
+        t = default_timer()
+        function(I)
+        times.append(default_timer() - t)
+        if default_timer() - start > budget:
+            break
+    return times
+
+
+def run(sizes=(128, 512), repeat=5, warmup=1, pattern=None, budget=10., seed=0, log=None):
+    """
+    results = run(sizes=(128, 512), repeat=5, warmup=1, pattern=None, budget=10., seed=0, log=None)
+
+    Time the tasks on the images of each size.
+
+    Parameters
+    ----------
+    sizes :   Sizes of the (square) images.
+    repeat :  Number of timed calls of each task (default: 5).
+    warmup :  Number of calls of each task before it is timed (default: 1).
+    pattern : Regular expression: only the tasks whose name matches it are
+              timed (default: all).
+    budget :  Each task is called again while the calls have taken less
+              than `budget` seconds (default: 10).
+    seed :    Seed of the images (default: 0).
+    log :     File where the timings are written as they are taken
+              (default: none).
+
+    Returns
+    -------
+    results : dictionary with the keys 'meta' (description of the run) and
+              'results' (for each ``name@size``, the 'name', 'size' and
+              'times' of the task, and their 'min', 'median', 'mean' and
+              'std'; or the 'error' the task raised).
+    """
+    selected = [(name, function) for name, function in tasks()
+                    if pattern is None or re.search(pattern, name)]
+    results = {}
+    for size in sizes:
+        I = images(size, seed)
+        for name, function in selected:
+            key = '%s@%d' % (name, size)
+            r = {'name': name, 'size': size}
+            try:
+                r['times'] = _time(function, I, repeat, warmup, budget)
+            except Exception, e:
+                r['error'] = '%s: %s' % (e.__class__.__name__, e)
+            else:
+                t = np.array(r['times'])
+                r.update(min=t.min(), median=float(np.median(t)), mean=t.mean(), std=t.std())
+            results[key] = r
+            if log is not None:
+                if 'error' in r:
+                    print >>log, '%-28s %s' % (key, r['error'])
+                else:
+                    print >>log, '%-28s %10.6f s (median %.6f, %d runs)' % (key, r['min'], r['median'], len(r['times']))
+    meta = {
+        'pymorph': pm.__version__,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sizes': list(sizes),
+        'repeat': repeat,
+        'warmup': warmup,
+        'budget': budget,
+        'seed': seed,
+        'pattern': pattern,
+    }
+    return {'meta': meta, 'results': results}
+
+
+def save(results, filename):
+    """
+    save(results, filename)
+
+    Write the `results` of `run` to `filename`, as JSON.
+    """
+    with open(filename, 'w') as out:
+        json.dump(results, out, indent=1, sort_keys=True)
+
+
+def load(filename):
+    """
+    results = load(filename)
+
+    Read the results written by `save`.
+    """
+    with open(filename) as input:
+        return json.load(input)
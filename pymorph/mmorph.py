@@ -105,6 +105,7 @@ pattern recognition and image analysis.
 - `thick()`        : Image transformation by thickening.
 - `thin()`         : Image transformation by thinning.
 - `threshad()`     : Threshold (adaptive)
+- `tiled()`        : Apply a local operator tile by tile, in parallel.
 - `toggle()`       : Image contrast enhancement or classification by the toggle operator.
 - `union()`        : Union of images.
 - `watershed()`    : Watershed detection.
@@ -117,6 +118,8 @@ from __future__ import division
 from pymorph_version import __version__, __version_info__
 
 import sys, os
+import threading
+from collections import OrderedDict
 mydir = os.path.dirname(__file__)
 try:
     sys.imagepath += [os.path.join(mydir, 'data')]
@@ -139,6 +142,7 @@ __all__ = \
     ,'label'
     ,'neg'
     ,'threshad'
+    ,'tiled'
     ,'toggle'
     ,'addm'
     ,'areaclose'
@@ -161,6 +165,7 @@ __all__ = \
     ,'drawv'
     ,'endpoints'
     ,'erode'
+    ,'flood'
     ,'gdist'
     ,'gradm'
     ,'grain'
@@ -333,15 +338,32 @@ def center(f, b=None):
     y : Image
     """
 
+    from numpy import nonzero
+
     if b is None: b = secross()
+    # a pixel of beta1 or beta2 depends on the pixels at most 3 openings or
+    # closings (each of radius 2*r) away: only the box around the pixels
+    # changed by the last pass (plus this margin) is recomputed
+    x = mat2set(b)[0]
+    m = (6*abs(x).max() if len(x) else 0)
+    h,w = f.shape
+    r0,r1,c0,c1 = 0,h,0,w
+    copied = False
     while True:
-        beta1 = asf(f,'COC',b,1)
-        beta2 = asf(f,'OCO',b,1)
-
-        prev = f
-        f = union(intersec(y,beta1),beta2)
-        if isequal(prev,f):
+        a0,a1,b0,b1 = max(r0-m,0),min(r1+m,h),max(c0-m,0),min(c1+m,w)
+        fw = f[a0:a1,b0:b1]
+        beta1 = asf(fw,'COC',b,1)
+        beta2 = asf(fw,'OCO',b,1)
+        y = union(intersec(fw,beta1),beta2)[r0-a0:r1-a0, c0-b0:c1-b0]
+        rows,cols = nonzero(y != f[r0:r1,c0:c1])
+        if not len(rows):
             return f
+        if not copied:
+            f = f.copy()
+            copied = True
+        f[r0:r1,c0:c1] = y
+        r0,r1 = max(r0+rows.min()-m,0), min(r0+rows.max()+1+m,h)
+        c0,c1 = max(c0+cols.min()-m,0), min(c0+cols.max()+1+m,w)
 
 
 def close_holes(f, Bc=None):
@@ -369,9 +391,9 @@ def close_holes(f, Bc=None):
     return neg(infrec(delta_f, neg(f), Bc))
 
 
-def dist(f, Bc=None, metric='euclidean'):
+def dist(f, Bc=None, metric='euclidean', spacing=None, dtype=None):
     """
-    y = dist(f, Bc={3x3 cross}, metric='euclidean')
+    y = dist(f, Bc={3x3 cross}, metric='euclidean', spacing=None, dtype=None)
 
     Distance transform.
 
@@ -381,8 +403,10 @@ def dist(f, Bc=None, metric='euclidean'):
     complement of `f`. The distances available are based on the
     Euclidean metrics and on metrics generated by a a regular graph,
     that is characterized by a connectivity rule defined by the
-    structuring element `Bc`. The implementation of the Euclidean
-    algorithm is based on LotuZamp:01 .
+    structuring element `Bc`. The Euclidean distance is exact and is
+    computed in linear time by the separable lower envelope algorithm of
+    Felzenszwalb and Huttenlocher. Pixels outside the image do not count
+    as background.
 
     Parameters
     ----------
@@ -391,12 +415,18 @@ def dist(f, Bc=None, metric='euclidean'):
     Bc : ndarray, optional
         Connectivity structure element (default: 3x3 cross)
     metric : {'euclidean' [default], 'euclidean2'}, optional
-        Metric to use.
+        Metric to use ('euclidean2' is the squared Euclidean distance).
+    spacing : (dy,dx), optional
+        Pixel size along each axis, for the Euclidean metrics (default: 1).
+    dtype : dtype, optional
+        Output type for the Euclidean metrics. Integer distances are
+        rounded and saturated; use 'float32' for the exact values.
 
     Returns
     -------
     y : ndarray
         distance image in uint16, or, if metric=='euclidean2', in int32
+        (unless `dtype` is given)
 
     See Also
     --------
@@ -404,11 +434,11 @@ def dist(f, Bc=None, metric='euclidean'):
     mahotas.distance : in mahotas package, faster C++ implementation
     scipy.ndimage.distance_transform_edt : in scipy, faster C implementation
     """
-    return cdist(f=f,g=None,Bc=Bc,metric=metric)
+    return cdist(f=f,g=None,Bc=Bc,metric=metric,spacing=spacing,dtype=dtype)
 
-def cdist(f, g=None, Bc=None,metric=None):
+def cdist(f, g=None, Bc=None,metric=None, spacing=None, dtype=None):
     """
-    y = cdist(f, g, Bc=None, metric=None)
+    y = cdist(f, g, Bc=None, metric=None, spacing=None, dtype=None)
 
     Conditional (geodesic) distance transform.
 
@@ -420,8 +450,9 @@ def cdist(f, g=None, Bc=None,metric=None):
     The distances available are based on the
     Euclidean metrics and on metrics generated by a a regular graph,
     that is characterized by a connectivity rule defined by the
-    structuring element Bc. The implementation of the Euclidean
-    algorithm is based on LotuZamp:01 .
+    structuring element Bc. Without `g`, the Euclidean distance is the
+    exact linear time transform used by `dist`; the conditional Euclidean
+    distance is based on LotuZamp:01 .
 
     Parameters
     ----------
@@ -430,6 +461,10 @@ def cdist(f, g=None, Bc=None,metric=None):
     Bc :     Structuring Element Default: None (3x3 elementary
             cross). (connectivity)
     metric : Metric to use, one of ('euclidean', 'euclidean2'), 'euclidean' by default.
+    spacing : (dy,dx), optional
+        Pixel size along each axis (only for the Euclidean metrics without `g`).
+    dtype : dtype, optional
+        Output type for the Euclidean metrics without `g` (see `dist`).
 
     Returns
     -------
@@ -442,26 +477,32 @@ def cdist(f, g=None, Bc=None,metric=None):
     if Bc is None: Bc = secross()
     if metric is not None:
        metric = lower(metric)
+    euclidean = metric in ('euclidean', 'euc2', 'euclidean2')
+    if euclidean and g is None:
+        d = _edt2(f, spacing)
+        if metric == 'euclidean':
+            d = sqrt(d)
+            if dtype is None: dtype = 'uint16'
+        elif dtype is None:
+            dtype = 'int32'
+        dtype = numpy.dtype(dtype)
+        if dtype.kind == 'f':
+            return d.astype(dtype)
+        d = numpy.floor(d + .5)
+        return d.clip(0, numpy.iinfo(dtype).max).astype(dtype)
+    if spacing is not None or dtype is not None:
+        raise ValueError, 'pymorph.cdist: spacing and dtype are only supported for the Euclidean distance without g'
     f = gray(f,'uint16')
-    y = intersec(f,0)
     if g is not None:
-        g = (~g)*255
-    if (metric == 'euclidean') or (metric == 'euc2') or (metric == 'euclidean2'):
-        i=1
-        while not isequal(f,y):
+        g = gray(~g,'uint16',255)
+    if euclidean:
+        # pass i erodes by the squared distance increments of ring i
+        def b(i):
             a4 = -4*i+2
             a2 = -2*i+1
-            b = to_int32([[a4,a2,a4],
-                          [a2, 0,a2],
-                          [a4,a2,a4]])
-            y=f
-            i+=1
-            if g is not None:
-                f = union(erode(f,b),g)
-            else:
-                f = erode(f,b)
-        if metric == 'euclidean':
-            f = to_uint16(sqrt(f)+0.5)
+            return to_int32([[a4,a2,a4],
+                             [a2, 0,a2],
+                             [a4,a2,a4]])
     else:
         if isequal(Bc, secross()):
             b = to_int32([[-2147483647,  -1, -2147483647],
@@ -472,14 +513,98 @@ def cdist(f, g=None, Bc=None,metric=None):
                           [-1, 0,-1],
                           [-1,-1,-1]])
         else: b = Bc # This seems wrong, but it's the original code
-        while not isequal(f,y):
-            y=f
-            f = union(erode(f,b),g)
+    # iterate f = union(erode(f,b),g) through its negation (see cerode)
+    if callable(b):
+        bneg = lambda i: sereflect(b(i))
+    else:
+        bneg = sereflect(b)
+    y = _frontier_cdilate(neg(f), (None if g is None else neg(g)), bneg, -1)
+    y = neg(y, y)
     if g is not None:
         return y * (g==0)
     return y
 
 
+def _edt2(f, spacing=None):
+    """
+    d2 = _edt2(f, spacing=None)
+
+    Squared Euclidean distance of each pixel of the binary image `f` to the
+    nearest 0 pixel (``inf`` if there is none), with the pixel `spacing`
+    ``(dy,dx)``.
+
+    Exact, separable algorithm (Felzenszwalb & Huttenlocher): distances
+    along the columns, then, on each row, the lower envelope of the
+    parabolas rooted at every pixel. Rows are processed together, so the
+    Python loops only run over the width.
+    """
+    import numpy as np
+    sy,sx = (1.,1.) if spacing is None else map(float, spacing)
+    f = np.asarray(f) != 0
+    if f.ndim == 1: f = f[np.newaxis,:]
+    h,w = f.shape
+    r = np.arange(h)[:,np.newaxis]
+    # distance (in rows) to the nearest background pixel above and below
+    above = np.where(f, -h-w, r)
+    np.maximum.accumulate(above, axis=0, out=above)
+    below = np.where(f, 2*h+w, r)[::-1]
+    np.minimum.accumulate(below, axis=0, out=below)
+    d = np.minimum(r - above, below[::-1] - r)
+    g = (sy*d)**2
+    g[d >= h+w] = np.inf
+    return _lower_envelope(g, sx)
+
+
+def _lower_envelope(g, sx):
+    """
+    d2 = _lower_envelope(g, sx)
+
+    ``d2[:,c] = min_q (sx*(c-q))**2 + g[:,q]`` for every row of `g`.
+    """
+    import numpy as np
+    h,w = g.shape
+    sx2 = sx*sx
+    # one column of the image per row of these arrays, so that the
+    # per-column steps read contiguous memory
+    g = np.where(np.isinf(g), 1e30, g).T.ravel()
+    v = np.zeros(w*h, np.intp)          # abscissae of the envelope parabolas
+    z = np.zeros((w+1)*h)               # boundaries between them
+    rows = np.arange(h)
+    z[:h] = -np.inf
+    z[h:2*h] = np.inf
+    k = rows.copy()                     # flat index of the last parabola
+    s = np.empty(h)
+    for q in xrange(1,w):
+        fq = g[q*h:q*h+h] + sx2*q*q
+        act = rows
+        kact = k
+        while len(act):
+            vk = v[kact]
+            sa = (fq[act] - g[vk*h + act] - sx2*vk*vk) / (2*sx2*(q - vk))
+            s[act] = sa
+            pop = sa <= z[kact]
+            act = act[pop]
+            kact = kact[pop] - h
+            k[act] = kact
+        k += h
+        v[k] = q
+        z[k] = s
+        z[k+h] = np.inf
+    # the parabola under column c is the number of boundaries z[1:] below
+    # c, i.e., of boundaries with floor(z)+1 <= c: a cumulated histogram
+    n = k // h + 2
+    z = z.reshape((w+1,h)).T
+    p = np.where(np.arange(w+1) < n[:,np.newaxis], np.floor(z.clip(-1,w-1)) + 1, w).astype(np.intp)
+    r = rows[:,np.newaxis]
+    p += (w+1)*r
+    kc = np.bincount(p.ravel(), minlength=h*(w+1)).reshape((h,w+1))[:,:w]
+    kc = kc.cumsum(1) - 1
+    vk = v[kc*h + r]
+    d2 = sx2*(np.arange(w) - vk)**2 + g[vk*h + r]
+    d2[d2 >= 1e29] = np.inf
+    return d2
+
+
 def edgeoff(f, Bc=None):
     """
     y = edgeoff(f, Bc={3x3 cross})
@@ -720,9 +845,15 @@ def label(f, Bc=None):
     0) are not labeled. The maximum label value in the output image
     gives the number of its connected components.
 
+    Labels are assigned in raster order of the first pixel of each
+    component. The connectivity is taken to be symmetric. The implementation
+    is a two-pass algorithm: row runs get provisional labels, which are then
+    merged with a union-find over the neighbouring runs.
+
     Parameters
     ----------
-    f :  Binary image.
+    f :  Binary image, or stack (N,H,W) of binary images (which are
+         labelled independently).
     Bc : Connectivity (default: 3x3 cross)
 
     Returns
@@ -731,33 +862,203 @@ def label(f, Bc=None):
         If number of labels is less than 65535, the data type
         is uint16, otherwise it is int32.
     """
+    import numpy as np
     if Bc is None: Bc = secross()
     if not isbinary(f):
         f = (f > 0)
-    f = pad4n(f, Bc, 0)
-    neighbours = se2flatidx(f,Bc)
-    labeled = f * 0
-    f = f.ravel()
-    labeledflat=labeled.ravel()
-    label = 1
-    queue = []
-    for i in xrange(f.size):
-        if f[i] and labeledflat[i] == 0:
-            labeledflat[i]=label
-            queue=[i+bi for bi in neighbours]
-            while queue:
-                ni=queue.pop()
-                if f[ni] and labeledflat[ni] == 0:
-                    labeledflat[ni]=label
-                    for n in neighbours+ni:
-                        queue.append(n)
-            label += 1
-    return labeled[1:-1,1:-1] # revert the pad4n() call above
-
-
-def neg(f):
+    Bh, Bw = Bc.shape
+    assert Bh%2 and Bw%2, 'structuring element must be odd sized'
+    if len(f.shape) == 3:
+        # the images are labelled at once (by groups of about _batch_pixels
+        # pixels), one above the other. Labels are given in raster order,
+        # so those of an image follow those of the previous images
+        m = max(_batch_pixels // max(f.shape[1]*f.shape[2],1), 1)
+        if len(f) > m:
+            return np.concatenate([label(f[i:i+m], Bc) for i in xrange(0,len(f),m)])
+        y = _unstack(label(_stack(f, _se_rows(mat2set(Bc)[0]), False), Bc), f.shape)
+        last = np.maximum.accumulate(y.reshape((len(y),-1)).max(1)) if y.size else np.zeros(len(y),int)
+        first = np.concatenate(([0], last[:-1])).astype(np.int32)
+        y = y.astype(np.int32)
+        y -= (y > 0) * first[:,np.newaxis,np.newaxis]
+        if not len(y) or (last - first).max() < 65535:
+            y = y.astype(np.uint16)
+        return y
+    return _label_components(f, Bc, lambda src, dst: f[src] & f[dst])
+
+
+def _label_components(f, Bc, linked):
+    """
+    y = _label_components(f, Bc, linked)
+
+    Two-pass union-find labelling of the connected components of the
+    pixels where `f` is nonzero.
+
+    Parameters
+    ----------
+    f : Binary image (the pixels to label)
+    Bc : Structuring element (connectivity)
+    linked : function. ``linked(src, dst)`` (two slice tuples, as returned
+        by `_shift_slices`) is True where the pixels ``src`` and their
+        neighbours ``dst`` are connected (both must be in `f`).
+
+    Returns
+    -------
+    y : Image of labels, numbered from 1 in raster order of the first pixel
+        of each component (0 outside `f`): uint16 or, for 65535 labels or
+        more, int32.
     """
-    y = neg(f)
+    import numpy as np
+    offsets = _se_offsets(Bc)
+
+    # First pass: provisional labels. When Bc connects horizontal
+    # neighbours, every run of linked pixels along a row gets a single
+    # provisional label, otherwise each pixel gets its own.
+    starts = f.copy()
+    if (0,1) in offsets:
+        src, dst = _shift_slices(f.shape, 0, 1)
+        starts[dst] &= ~linked(src, dst)
+    runs = np.cumsum(starts.ravel()).reshape(f.shape)
+    runs *= f
+    nruns = runs.max() if runs.size else 0
+
+    # Equivalences between provisional labels, one shifted slice per offset
+    alist, blist = [], []
+    for dy,dx in offsets:
+        if (dy,dx) == (0,1):
+            continue # already merged into the runs
+        src, dst = _shift_slices(f.shape, dy, dx)
+        a = runs[src]
+        b = runs[dst]
+        sel = linked(src, dst) & (a != b)
+        a = a[sel]
+        b = b[sel]
+        # two runs that touch give the same pair on consecutive pixels
+        new = np.ones(len(a), bool)
+        new[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+        alist.append(a[new])
+        blist.append(b[new])
+    parent = np.arange(nruns+1)
+    if alist:
+        parent = _uf_merge(parent, np.concatenate(alist), np.concatenate(blist))
+
+    # Second pass: roots are the first provisional label (in raster order)
+    # of each component, so ranking them gives the final labels.
+    _, lut = np.unique(parent, return_inverse=True)
+    if lut.max() < 65535:
+        lut = lut.astype(np.uint16)
+    else:
+        lut = lut.astype(np.int32)
+    return lut[runs]
+
+
+def _se_offsets(Bc):
+    """
+    offsets = _se_offsets(Bc)
+
+    Neighbour offsets of the connectivity `Bc`, symmetrised and reduced to
+    the forward half-plane (i.e., (dy,dx) with dy > 0 or dy == 0 and dx > 0).
+
+    Parameters
+    ----------
+    Bc : Structuring element (connectivity)
+
+    Returns
+    -------
+    offsets : sorted list of (dy,dx) tuples
+    """
+    from numpy import asarray, newaxis, where
+    Bc = asarray(Bc)
+    if len(Bc.shape) == 1: Bc = Bc[newaxis,:]
+    h,w = Bc.shape
+    offsets = set()
+    for i,j in zip(*where(Bc)):
+        dy, dx = int(i - h//2), int(j - w//2)
+        if (dy,dx) < (0,0):
+            dy, dx = -dy, -dx
+        if (dy,dx) != (0,0):
+            offsets.add((dy,dx))
+    return sorted(offsets)
+
+
+def _shift_slices(shape, dy, dx):
+    """
+    src, dst = _shift_slices(shape, dy, dx)
+
+    Index tuples such that ``f[dst]`` is the (dy,dx) neighbour of ``f[src]``
+    for every pixel whose neighbour falls inside the image.
+
+    Parameters
+    ----------
+    shape : (h,w) image shape
+    dy, dx : integer offset
+
+    Returns
+    -------
+    src, dst : tuples of slices
+    """
+    def axis(d, n):
+        if d >= 0:
+            return slice(0, max(n-d,0)), slice(min(d,n), n)
+        return slice(min(-d,n), n), slice(0, max(n+d,0))
+    h,w = shape
+    sy, ty = axis(dy, h)
+    sx, tx = axis(dx, w)
+    return (sy,sx), (ty,tx)
+
+
+def _uf_compress(parent):
+    """
+    parent = _uf_compress(parent)
+
+    Full path compression of a union-find forest by pointer jumping.
+    """
+    while True:
+        grand = parent[parent]
+        if (grand == parent).all():
+            return parent
+        parent = grand
+
+
+def _uf_merge(parent, a, b):
+    """
+    parent = _uf_merge(parent, a, b)
+
+    Merge the sets of `a[i]` and `b[i]` (for all `i`) in the union-find
+    forest `parent`.
+
+    All pairs are processed at once: each round links every root to the
+    smallest root it is paired with (if smaller) and compresses the forest,
+    until all pairs share a root. Every root that is paired with a smaller
+    one is absorbed in a round, so chains of sets merge in a logarithmic
+    number of rounds. The root of each set is always its smallest element.
+
+    Parameters
+    ----------
+    parent : ndarray of indices (a forest where roots have parent[i] == i)
+    a, b : ndarrays of indices
+
+    Returns
+    -------
+    parent : fully compressed forest (parent[i] is the root of i)
+    """
+    from numpy import maximum, minimum
+    while True:
+        parent = _uf_compress(parent)
+        ra = parent[a]
+        rb = parent[b]
+        diff = (ra != rb)
+        if not diff.any():
+            return parent
+        a, b = a[diff], b[diff]
+        ra, rb = ra[diff], rb[diff]
+        # of the links of a root, keep the smallest (an assignment would
+        # keep an arbitrary one)
+        minimum.at(parent, maximum(ra,rb), minimum(ra,rb))
+
+
+def neg(f, out=None):
+    """
+    y = neg(f, out=None)
 
     Negate an image.
 
@@ -768,14 +1069,19 @@ def neg(f):
     Parameters
     ----------
     f : Unsigned gray-scale (uint8 or uint16), signed (int32) or binary image.
+    out : ndarray of the type of `f`, optional
+        Output array (may be `f` itself).
 
     Returns
     -------
     y : ndarray of same shape and dtype as `f`
     """
+    from numpy import int32, invert, negative
 
-    y = limits(f)[0] + limits(f)[1] - f
-    return y.astype(f.dtype)
+    limits(f) # only accept the image types
+    # inf + sup - f is -f for int32 (symmetric limits) and ~f otherwise
+    if f.dtype == int32: return negative(f, out)
+    return invert(f, out)
 
 
 def threshad(f, f1, f2=None):
@@ -805,6 +1111,187 @@ def threshad(f, f1, f2=None):
     return (f1 <= f) & (f <= f2)
 
 
+def tiled(op, f, args=(), kwargs=None, tile=1024, halo=None, workers=None, processes=False, out=None):
+    """
+    y = tiled(op, f, args=(), kwargs={}, tile=1024, halo=None, workers=None, processes=False, out=None)
+
+    Apply local operators tile by tile, in parallel or out of core.
+
+    `tiled` computes ``op(f, *args, **kwargs)`` on tiles of `f` of `tile`
+    x `tile` pixels, each one extended by a margin (halo) of the
+    neighbouring pixels, using a pool of `workers` threads (or processes).
+    The results, cropped to the tiles, are assembled in `y`, which is
+    identical to ``op(f, *args, **kwargs)`` if the halo covers the pixels
+    each output pixel depends on.
+
+    The halo is computed from the structuring elements for `dilate`,
+    `erode`, `open`, `close`, `gradm`, `openth`, `closeth`, `asf`, `supgen`
+    and `toggle`; it must be given for any other operator. The arguments
+    in `args` or `kwargs` that are arrays of the shape of `f` (like the
+    images of `toggle`) are cut in tiles as `f`.
+
+    `op` may also be a chain of operators: a list of stages ``(op, args,
+    kwargs)`` (or ``(op, args)``, or just `op`) applied in turn to each
+    tile, whose halo is the sum of the halos of the stages.
+
+    `f` is only read one tile at a time (and only a few tiles are in
+    memory at any time), so that a `numpy.memmap`, or any object with a
+    `shape` which can be sliced, can be streamed through the operators in
+    row bands (``tile=(rows, None)``) into an `out` memmap, with memory
+    proportional to the size of a band.
+
+    Parameters
+    ----------
+    op :        Operator, called as ``op(f, *args, **kwargs)``, or list of
+                stages.
+    f :         Image (2D), or source of image tiles.
+    args :      Other positional arguments of `op` (default: none).
+    kwargs :    Keyword arguments of `op` (default: none).
+    tile :      Integer or (rows, columns) pair. Size of the tiles; None
+                is the whole image (default: 1024).
+    halo :      Integer or (rows, columns) pair. Margin around the tiles
+                (default: computed from the arguments of `op`).
+    workers :   Number of threads or processes (default: number of CPUs).
+    processes : Whether to use processes instead of threads (default:
+                False). `op` and its arguments must then be picklable.
+    out :       Image of the shape of `f` where the result is written
+                (default: a new image).
+
+    Returns
+    -------
+    y : Image (`out`, if given)
+
+    Examples
+    --------
+
+    ::
+
+        g = tiled(open, f, (sedisk(5),), workers=16)
+
+    streams a slide on disk through an erosion and an opening:
+
+    ::
+
+        f = numpy.memmap('slide.raw', numpy.uint8, 'r', shape=(100000,100000))
+        y = numpy.memmap('out.raw', numpy.uint8, 'w+', shape=f.shape)
+        tiled([(erode, (sebox(),)), (open, (sedisk(5),))], f, tile=(512,None), out=y)
+        y.flush()
+    """
+    import numpy as np
+    from multiprocessing import cpu_count
+    from multiprocessing.pool import Pool, ThreadPool
+
+    if not hasattr(f, 'shape'): f = np.asarray(f)
+    if kwargs is None: kwargs = {}
+    assert len(f.shape) == 2, 'pymorph.tiled: only 2D images are supported'
+    stages = ([(op, args, kwargs)] if callable(op) else
+              [(s, (), {}) if callable(s) else tuple(s) + ((), {})[len(s)-1:] for s in op])
+    if halo is None:
+        halo = np.sum([_tiled_halo(*s) for s in stages], 0)
+    hy,hx = (halo,halo) if np.isscalar(halo) else halo
+    h,w = f.shape
+    ty,tx = (tile,tile) if np.isscalar(tile) or tile is None else tile
+    ty,tx = (ty or h), (tx or w)
+    if out is not None:
+        assert out.shape == f.shape, 'pymorph.tiled: out must have the shape of f'
+
+    def jobs():
+        for r0 in xrange(0, h, ty):
+            for c0 in xrange(0, w, tx):
+                r1,c1 = min(r0+ty,h), min(c0+tx,w)
+                a0,a1,b0,b1 = max(r0-hy,0), min(r1+hy,h), max(c0-hx,0), min(c1+hx,w)
+                def cut(x):
+                    if isinstance(x, np.ndarray) and x.shape == f.shape:
+                        return x[a0:a1,b0:b1]
+                    return x
+                yield ((r0,r1,c0,c1), (r0-a0,r1-a0,c0-b0,c1-b0), f[a0:a1,b0:b1],
+                       [(s, map(cut, a), dict((k,cut(v)) for k,v in kw.iteritems())) for s,a,kw in stages])
+
+    if workers is None: workers = cpu_count()
+    pool = None
+    if workers > 1:
+        pool = (Pool if processes else ThreadPool)(workers)
+    y = out
+    try:
+        # the jobs are handed out a few at a time, so that only these tiles
+        # (and their results) are in memory
+        pending = jobs()
+        while True:
+            batch = [job for _,job in zip(xrange(2*workers), pending)]
+            if not batch: break
+            if pool is not None:
+                results = pool.imap_unordered(_tiled_run, batch)
+            else:
+                results = map(_tiled_run, batch)
+            for (r0,r1,c0,c1),t in results:
+                if y is None: y = np.empty(f.shape, t.dtype)
+                y[r0:r1,c0:c1] = t
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return y
+
+
+def _tiled_run(job):
+    """
+    place, t = _tiled_run(job)
+
+    Apply the operators of a `tiled` job to its tile; `t` is the result for
+    the part of the output at `place`.
+    """
+    place, (p0,p1,q0,q1), t, stages = job
+    for op,args,kwargs in stages:
+        t = op(t, *args, **kwargs)
+    return place, t[p0:p1,q0:q1]
+
+
+def _tiled_halo(op, args, kwargs):
+    """
+    hy,hx = _tiled_halo(op, args, kwargs)
+
+    Margin (rows, columns) around a tile that ``op(f, *args, **kwargs)``
+    needs, for the operators known to `tiled`.
+    """
+    import numpy as np
+    from inspect import getargspec
+
+    def reach(B, k=1):
+        if B is None: B = secross()
+        x = mat2set(B)[0]
+        if not len(x): return np.zeros(2, int)
+        return k*abs(np.asarray(x)).max(0)
+
+    # the functions wrapped by pymorph.profiling are known by the original
+    op = getattr(op, '__wrapped__', op)
+    known = lambda *fs: any(op is getattr(fn, '__wrapped__', fn) for fn in fs)
+    names,_,_,defaults = getargspec(op)
+    p = dict(zip(names[len(names)-len(defaults or ()):], defaults or ()))
+    p.update(zip(names[1:], args))
+    p.update(kwargs)
+    if known(dilate, erode):
+        m = reach(p.get('B', p.get('b')))
+    elif known(open, openth):
+        m = reach(p['b'], 2)
+    elif known(close):
+        m = reach(p['Bc'], 2)
+    elif known(closeth):
+        m = reach(p['B'], 2)
+    elif known(gradm):
+        m = np.maximum(reach(p['Bdil']), reach(p['Bero']))
+    elif known(asf):
+        # each opening or closing of the sequence, at every scale
+        m = sum(reach(sesum(p['B'],i+1), 2*len(p['seq'])) for i in xrange(p['n']))
+    elif known(supgen):
+        A,Bc = p['interval']
+        m = np.maximum(reach(A), reach(Bc))
+    elif known(toggle):
+        m = np.zeros(2, int)
+    else:
+        raise ValueError, 'pymorph.tiled: the halo of %s must be given' % getattr(op, '__name__', op)
+    return int(m[0]), int(m[1])
+
+
 def toggle(f, f1, f2, gray_mode=True):
     """
     y = toggle(f, f1, f2, gray_mode=True)
@@ -843,9 +1330,9 @@ def toggle(f, f1, f2, gray_mode=True):
     return y
 
 
-def addm(f1, f2):
+def addm(f1, f2, out=None):
     """
-    y = addm(f1, f2)
+    y = addm(f1, f2, out=None)
 
     Addition of two images, with saturation.
 
@@ -860,6 +1347,8 @@ def addm(f1, f2):
         binary image.
     f2 : Unsigned gray-scale (uint8 or uint16), signed (int32) or
         binary image. Or constant.
+    out : ndarray of the type of `f1`, optional
+        Output array (may be `f1` itself).
 
     Returns
     -------
@@ -882,12 +1371,7 @@ def addm(f1, f2):
         [255 255  80 150 250 255 255]
         [100 140 180 240 255 110 130]
     """
-    from numpy import array, minimum, maximum
-
-    if type(f2) is array:
-        assert f1.dtype == f2.dtype, 'Cannot have different datatypes:'
-    y = maximum(minimum(f1.astype('d')+f2, limits(f1)[1]),limits(f1)[0])
-    return y.astype(f1.dtype)
+    return _saturated(f1, f2, False, out)
 
 
 def areaclose(f, a, Bc=None):
@@ -928,7 +1412,8 @@ def areaopen(f, a, Bc=None):
     by the structuring element `Bc`. This operator is generalized to
     gray-scale images by applying the binary operator successively
     on slices of `f` taken from higher threshold levels to lower
-    threshold levels.
+    threshold levels. Gray-scale images are filtered by pruning their
+    max-tree, which gives the same result.
 
     Parameters
     ----------
@@ -979,25 +1464,121 @@ def areaopen(f, a, Bc=None):
 
     """
 
+    import numpy as np
     if Bc is None: Bc = secross()
     if isbinary(f):
       fr = label(f,Bc)      # binary area open, use area measurement
       g = blob(fr,'area')
       y = threshad(g,a)
     else:
-      y = intersec(f,0)
-      zero = binary(y)
-      k1 = f.min()
-      k2 = f.max()
-      for k in xrange(k1,k2+1):   # gray-scale, use thresholding decomposition
-        fk = threshad(f,k)
-        fo = areaopen(fk,a,Bc)
-        if isequal(fo,zero):
-          break
-        y = union(y, gray(fo,datatype(f),k))
+      # gray-scale: each pixel goes to the level of its lowest ancestor (in
+      # the max-tree) with area at least a. Areas grow towards the root, so
+      # pointer jumping stops at the first node that is kept.
+      if len(f.shape) == 1: f = f[np.newaxis,:]
+      parent, S, area = _maxtree(f, Bc)
+      fl = f.ravel()
+      pixels = np.arange(fl.size)
+      keep = (area >= a) & ((fl[parent] != fl) | (parent == pixels))
+      up = np.where(keep, pixels, parent)
+      while True:
+        nup = up[up]
+        if np.all(nup == up): break
+        up = nup
+      y = np.where(keep[up], fl[up], np.minimum(fl.min(), 0))
+      y = np.maximum(y, np.minimum(fl, 0)).reshape(f.shape).astype(f.dtype)
     return y
 
 
+def _maxtree(f, Bc, values=False):
+    """
+    parent, S, area = _maxtree(f, Bc)
+    parent, S, area, total, highest = _maxtree(f, Bc, values=True)
+
+    Max-tree of `f`: the inclusion tree of the connected components of its
+    upper threshold sets.
+
+    Union-find over the pixels in decreasing grey level order (Berger et
+    al., 2007), with union by rank. The node of the pixels processed so far
+    is kept at the `top` of each disjoint set.
+
+    Parameters
+    ----------
+    f : 2-D image
+    Bc : Structuring element (connectivity)
+    values : boolean, optional
+        Whether to also return `total` and `highest` (default: False).
+
+    Returns
+    -------
+    parent : ndarray. For each pixel (raster index), its parent: a pixel of
+        the same node or, for the canonical pixel of a node, the canonical
+        pixel of the parent node. The root is its own parent.
+    S : ndarray of the raster indices, in processing order (every pixel
+        comes after its descendants).
+    area : ndarray. Area of the node of each canonical pixel.
+    total : ndarray. Sum of `f` over the node of each canonical pixel.
+    highest : ndarray. Highest pixel of the node of each canonical pixel (the
+        first in raster order among the highest).
+    """
+    import numpy as np
+    h,w = f.shape
+    offsets = _se_offsets(Bc)
+    m = max([max(abs(dy),abs(dx)) for dy,dx in offsets] + [1])
+    W = w + 2*m
+    # the union-find runs on the image padded by m, whose border pixels are
+    # never processed (zpar < 0)
+    idx = ((np.arange(h)[:,np.newaxis] + m)*W + np.arange(m, m+w)).ravel()
+    neighbours = [dy*W + dx for dy,dx in offsets]
+    neighbours += [-n for n in neighbours]
+    S = idx[np.argsort(f.ravel(), kind='mergesort')[::-1]].tolist()
+    M = (h+2*m)*W
+    zpar = [-1]*M
+    rank = [0]*M
+    top = [0]*M
+    parent = [-1]*M
+    area = [1]*M
+    if values:
+        fp = [0]*M
+        for i,v in zip(idx.tolist(), f.ravel().tolist()): fp[i] = v
+        total = fp[:]
+        highest = range(M)
+    for p in S:
+        zpar[p] = p
+        parent[p] = p
+        top[p] = p
+        zp = p
+        for n in neighbours:
+            q = p + n
+            r = zpar[q]
+            if r < 0: continue
+            while zpar[r] != r: r = zpar[r]
+            while q != r:
+                q_ = zpar[q]
+                zpar[q] = r
+                q = q_
+            if r != zp:
+                t = top[r]
+                parent[t] = p
+                area[p] += area[t]
+                if values:
+                    total[p] += total[t]
+                    a, b = highest[p], highest[t]
+                    if fp[b] > fp[a] or (fp[b] == fp[a] and b < a):
+                        highest[p] = b
+                if rank[zp] < rank[r]:
+                    zp, r = r, zp
+                elif rank[zp] == rank[r]:
+                    rank[zp] += 1
+                zpar[r] = zp
+                top[zp] = p
+    o = -np.ones(M, np.intp)
+    o[idx] = np.arange(h*w)
+    if values:
+        return o[np.array(parent)[idx]], o[S], np.array(area)[idx], \
+            np.array(total)[idx], o[np.array(highest)[idx]]
+    return o[np.array(parent)[idx]], o[S], np.array(area)[idx]
+
+
 def asf(f, seq="OC", B=None, n=1):
     """
     y = asf(f, seq="OC", B={3x3 cross}, n=1)
@@ -1132,52 +1713,114 @@ def blob(f, measurement, output="image"):
 
     Parameters
     ----------
-    f :           Gray-scale (uint8 or uint16) image. Labeled image.
+    f :           Gray-scale (uint8 or uint16) image. Labeled image, or
+                  stack (N,H,W) of labeled images.
     measurement : Measurement. One of ('area', 'centroid', 'boundingbox').
     output : {'image' [default], 'data'}, optional
             Output format: if 'image', returns a binary image; if 'data',
-            returns a vector of measurements
+            returns a vector of measurements (a list of them, one for each
+            image, for a stack)
 
     Returns
     -------
     y : Gray-scale (uint8 or uint16) or binary image.
     """
     import numpy
-    from numpy import newaxis, ravel, zeros, sum, nonzero, array, asanyarray
+    from numpy import newaxis, zeros, cumsum, asanyarray, flatnonzero
     from string import lower
 
     measurement = lower(measurement)
     output      = lower(output)
     if len(f.shape) == 1: f = f[newaxis,:]
     assert measurement in ('area', 'centroid', 'boundingbox'), 'pymorph.blob: Unknown measurement type \'%s\'' % measurement
+    if len(f.shape) == 3:
+        # the images are measured at once, one above the other, with their
+        # labels shifted after those of the previous images (by groups of
+        # about _batch_pixels pixels: larger sorts are slower)
+        N,h,w = f.shape
+        m = max(_batch_pixels // max(h*w,1), 1)
+        if N > m:
+            ys = [blob(f[i:i+m], measurement, output) for i in xrange(0,N,m)]
+            return (sum(ys, []) if output == 'data' else numpy.concatenate(ys))
+        n = f.reshape((N,-1)).max(1).astype(numpy.intp) if f.size else zeros(N,numpy.intp)
+        first = cumsum(n) - n
+        pixels = flatnonzero(f)
+        labels = f.ravel()[pixels] + first[pixels // (h*w)]
+        y = _blob_measure(f.shape, int(n.sum()), pixels, labels, measurement, output)
+        if output != 'data':
+            return y
+        ys = []
+        for k in xrange(N):
+            if n[k] <= 0:
+                ys.append(asanyarray([]))
+                continue
+            yk = y[first[k]:first[k]+n[k]].copy()
+            if measurement != 'area':
+                # back to the rows of the image (measurements of absent
+                # labels are all zero)
+                rows = ([0] if measurement == 'centroid' else [1,3])
+                present = (yk != 0).any(1)
+                yk[numpy.ix_(present, rows)] -= k*h
+            ys.append(yk)
+        return ys
+    n = int(f.max()) if f.size else 0
+    if output == 'data' and n <= 0:
+        return asanyarray([])
+    pixels = flatnonzero(f)
+    return _blob_measure(f.shape, n, pixels, f.ravel()[pixels], measurement, output)
+
+
+def _blob_measure(shape, n, pixels, labels, measurement, output):
+    """
+    y = _blob_measure(shape, n, pixels, labels, measurement, output)
+
+    `blob` of the labeled image of `shape` (2-D, or a stack of images taken
+    as one above the other) with labels up to `n`, whose non-zero pixels
+    are at the (raster order) indices `pixels`, with labels `labels`.
+    """
+    import numpy
+    from numpy import zeros, arange, bincount, argsort, cumsum
+
+    w = shape[-1]
+    counts = bincount(labels, minlength=n+1)
+    present = counts[1:] > 0
+    if measurement == 'area':
+        if output == 'data': return counts[1:]
+        y = zeros(shape,numpy.int32)
+        y.flat[pixels] = counts[labels]
+        return y
+    rows = pixels // w
+    if measurement == 'centroid':
+        cy = bincount(labels, rows, n+1)[1:].astype(numpy.int64) // counts[1:].clip(1)
+        cx = bincount(labels, pixels % w, n+1)[1:].astype(numpy.int64) // counts[1:].clip(1)
+        if output == 'data': return numpy.column_stack((cy,cx))
+        y = zeros(shape,numpy.bool)
+        y.reshape((-1,w))[cy[present], cx[present]] = 1
+        return y
+    # boundingbox: sorting the labels (stably) groups the pixels of each
+    # blob in raster order, so the first and last give the rows
+    order = argsort(labels, kind='mergesort')
+    ends = cumsum(counts[1:])[present]
+    starts = ends - counts[1:][present]
+    rows = rows[order]
+    cols = pixels[order] % w
+    row0, row1 = rows[starts], rows[ends-1]
+    col0 = numpy.minimum.reduceat(cols, starts)
+    col1 = numpy.maximum.reduceat(cols, starts)
     if output == 'data':
-        y = []
-    elif measurement == 'centroid':
-        y = zeros(f.shape,numpy.bool)
-    else:
-        y = zeros(f.shape,numpy.int32)
-    for obj_id in xrange(f.max()):
-        blob = (f == (obj_id+1))
-        if measurement == 'area':
-            area = blob.sum()
-            if output == 'data': y.append(area)
-            else               : y += area*blob
-        elif measurement == 'centroid':
-            indy, indx  = nonzero(blob)
-            cy = sum(indy) // len(indy)
-            cx = sum(indx) // len(indx)
-            if output == 'data': y.append( (cy, cx) )
-            else               : y[cy, cx] = 1
-        elif measurement == 'boundingbox':
-            col, = nonzero(blob.any(0))
-            row, = nonzero(blob.any(1))
-            if output == 'data': y.append([col[0],row[0],col[-1]+1,row[-1]+1])
-            else:
-                y[row[0]:row[-1], col[0]] = 1
-                y[row[0]:row[-1],col[-1]] = 1
-                y[row[0], col[0]:col[-1]] = 1
-                y[row[-1],col[0]:col[-1]] = 1
-    return asanyarray(y)
+        y = zeros((n,4), numpy.intp)
+        y[present] = numpy.column_stack((col0, row0, col1+1, row1+1))
+        return y
+    y = zeros(shape,numpy.int32)
+    yr = y.reshape((-1,w))
+    for r0,r1,c0,c1 in ((row0,row1,col0,col0), (row0,row1,col1,col1),
+                        (row0,row0,col0,col1), (row1,row1,col0,col1)):
+        # the segment from (r0,c0) to (r1,c1), last pixel excluded
+        length = (r1 - r0) + (c1 - c0)
+        step = arange(length.sum()) - (cumsum(length) - length).repeat(length)
+        yr[r0.repeat(length) + (r1 > r0).repeat(length)*step,
+           c0.repeat(length) + (c1 > c0).repeat(length)*step] = 1
+    return y
 
 
 def cbisector(f, B, n):
@@ -1235,13 +1878,13 @@ def cdilate(f, g, Bc=None, n=1):
     y : Image
     """
 
+    from numpy import newaxis
+
     if Bc is None: Bc = secross()
-    f = intersec(f,g)
-    for i in xrange(n):
-        prev = f
-        f = intersec(dilate(f, Bc), g)
-        if isequal(f, prev): break
-    return f
+    if n >= f.size:
+        return _reconstruct(f, g, Bc)
+    if len(f.shape) == 1: f = f[newaxis,:]
+    return _frontier_cdilate(intersec(f,g), g, Bc, n)
 
 
 def cerode(f, g, Bc=None, n=1):
@@ -1266,13 +1909,110 @@ def cerode(f, g, Bc=None, n=1):
     y : Image
     """
 
+    from numpy import newaxis
+
     if Bc is None: Bc = secross()
-    f = union(f,g)
-    for i in xrange(n):
-        prev = f
-        f = union(erode(f,Bc),g)
-        if isequal(f, prev): break
-    return f
+    if len(f.shape) == 1: f = f[newaxis,:]
+    # g is negated in the type of f
+    g = _clip_to(g, f)
+    if len(g.shape) == 1: g = g[newaxis,:]
+    if n >= f.size:
+        return neg(_reconstruct(neg(f), neg(g), sereflect(Bc)))
+    # union(erode(f,Bc),g) is the negation of intersec(dilate(neg(f),Bc'),neg(g))
+    y = _frontier_cdilate(neg(union(f,g)), neg(g), sereflect(Bc), n)
+    return neg(y, y)
+
+
+# set by pymorph.profiling: called with the number of passes of the
+# iterative operators
+_iterations_hook = None
+
+def _frontier_cdilate(f, g, B, n, passes=False):
+    """
+    y = _frontier_cdilate(f, g, B, n)
+    y, t = _frontier_cdilate(f, g, B, n, passes=True)
+
+    At most `n` passes (-1 for no limit) of ``y = intersec(dilate(y,B),g)``
+    starting from the 2-D image `f` (`g` may be ``None``), stopping when
+    `y` is stable.
+
+    The pixels changed by a pass are kept in a list and the next pass only
+    recomputes their neighbours, so that its cost is proportional to the
+    change instead of to the image size (a pass that would recompute a
+    large part of the image is done on the whole image instead).
+
+    `B` may also be a function giving the structuring element of pass
+    ``i`` (``i = 1, 2, ...``): its support must not change and its values
+    must not increase with ``i``. If `passes`, `t` is the last pass that
+    changed each pixel (0 for the pixels never changed).
+    """
+    import numpy as np
+
+    Bi = (B(1) if callable(B) else B)
+    if isbinary(f): Bi = asbinary(Bi)
+    flat = isbinary(Bi)
+    x,v = mat2set(Bi)
+    x = np.asarray(x, np.intp).reshape((-1,2))
+    h,w = f.shape
+    my = (abs(x[:,0]).max() if len(x) else 0)
+    mx = (abs(x[:,1]).max() if len(x) else 0)
+    H,W = h+2*my, w+2*mx
+    # dilation reads P[p - x]: pixels outside the image have the least value
+    P = np.empty((H,W), f.dtype)
+    P.fill(limits(f)[0])
+    P[my:my+h, mx:mx+w] = f
+    Pf = P.ravel()
+    inside = np.zeros((H,W), bool)
+    inside[my:my+h, mx:mx+w] = True
+    inside = inside.ravel()
+    if g is not None:
+        g = np.asarray(g)
+        G = np.zeros((H,W), g.dtype)
+        G[my:my+h, mx:mx+w] = g
+        G = G.ravel()
+    off = x[:,0]*W + x[:,1]
+    last = np.empty(H*W, np.intp)
+    if passes: t = np.zeros((H,W), np.int32)
+    changed = None
+    i = 0
+    while i != n:
+        i += 1
+        if callable(B) and i > 1: v = mat2set(B(i))[1]
+        if changed is None or 4*len(changed)*len(off) > h*w:
+            m = np.empty((h,w), f.dtype)
+            m.fill(limits(f)[0])
+            s = np.empty((h,w), f.dtype)
+            for k,(dy,dx) in enumerate(x):
+                src = P[my-dy:my-dy+h, mx-dx:mx-dx+w]
+                np.maximum(m, (src if flat else add4dilate(src, v[k], s)), m)
+            if g is not None: np.minimum(m, g, m, casting='unsafe')
+            core = P[my:my+h, mx:mx+w]
+            r,c = np.nonzero(m != core)
+            changed = (r+my)*W + (c+mx)
+            core[...] = m
+        else:
+            cand = (changed[:,np.newaxis] + off).ravel()
+            cand = cand[inside[cand]]
+            # keep one copy of each candidate (the last one written to `last`)
+            last[cand] = np.arange(len(cand))
+            C = cand[last[cand] == np.arange(len(cand))]
+            m = np.empty(len(C), f.dtype)
+            m.fill(limits(f)[0])
+            for k in xrange(len(off)):
+                src = Pf[C - off[k]]
+                if not flat: src = add4dilate(src, v[k], src)
+                np.maximum(m, src, m)
+            if g is not None: np.minimum(m, G[C], m, casting='unsafe')
+            sel = (m != Pf[C])
+            changed = C[sel]
+            Pf[changed] = m[sel]
+        if passes: t.ravel()[changed] = i
+        if not len(changed): break
+    if _iterations_hook is not None: _iterations_hook(i)
+    y = P[my:my+h, mx:mx+w].copy()
+    if passes:
+        return y, t[my:my+h, mx:mx+w].copy()
+    return y
 
 
 def close(f, Bc =None):
@@ -1410,13 +2150,11 @@ def cthick(f, g, Iab=None, n=-1, theta=45, direction="clockwise"):
     assert isbinary(f), 'pymorph.cthick: f must be binary image'
 
     direction = upper(direction)
-    for i in xrange(n):
-        prev = f
-        for t in xrange(0,360,theta):
-            sup = supgen(f, interot(Iab, t, direction))
-            f = intersec(union(f, sup),g)
-        if isequal(prev, f): break
-    return f
+    w = f.shape[-1]
+    y = _pack(f)
+    G = _pack(g)
+    rots = _packed_intervals(Iab, theta, direction)
+    return _unpack(_packed_iterate(y, w, rots, n, False, G), w)
 
 
 def cthin(f, g, Iab=None, n=-1, theta=45, direction="clockwise"):
@@ -1449,13 +2187,11 @@ def cthin(f, g, Iab=None, n=-1, theta=45, direction="clockwise"):
     assert isbinary(f),'f must be binary image'
     direction = upper(direction)
     if n == -1: n = f.size
-    for i in xrange(n):
-        prev = f
-        for t in xrange(0,360,theta):
-            sup = supgen(f, interot(Iab, t, direction))
-            y = union(subm(f, sup),g)
-        if isequal(prev, f): break
-    return f
+    w = f.shape[-1]
+    y = _pack(f)
+    G = _pack(g)
+    rots = _packed_intervals(Iab, theta, direction)
+    return _unpack(_packed_iterate(y, w, rots, n, True, G), w)
 
 
 def cwatershed(f, markers, Bc=None, return_lines=False,is_gvoronoi=False):
@@ -1473,7 +2209,8 @@ def cwatershed(f, markers, Bc=None, return_lines=False,is_gvoronoi=False):
     domain or just a binary image that presents the watershed lines.
     To know more about watershed and watershed from markers, see
     BeucMeye:93. The implementation of this function is based on
-    LotuFalc:00.
+    LotuFalc:00, flooding with a hierarchical queue (one FIFO per grey
+    level). Pixels with the same cost are flooded in order of insertion.
 
     WARNING: There is a common mistake related to the
     marker image `g`. If this image contains only zeros and ones, but
@@ -1498,60 +2235,99 @@ def cwatershed(f, markers, Bc=None, return_lines=False,is_gvoronoi=False):
     --------
     mahotas.cwatershed : implementation of same interface in C++
     """
-    from numpy import ones, zeros, nonzero, array, put, take, argmin, transpose, compress, concatenate, where, uint8
+    import numpy as np
+    from collections import deque
     from heapq import heapify, heappush, heappop
     if Bc is None: Bc = secross()
     if isbinary(markers):
         markers = label(markers,Bc)
-    status = pad4n(zeros(f.shape,uint8),Bc, 3)
-    f = pad4n(f,Bc,0)                       # pad input image with 0
-    y = pad4n(markers,Bc,0)                 # pad marker image with 0
-    if return_lines:
-        y1 = intersec(binary(y), 0)
-        y1flat=y1.ravel()
-    costM = limits(f)[1] * ones(f.shape)  # cummulative cost function image
+    h,w = f.shape
+    status = pad4n(np.zeros(f.shape,np.uint8),Bc,3)   # 3 marks the border
+    ch,cw = (status.shape[0]-h)//2, (status.shape[1]-w)//2
+    fpad = pad4n(f,Bc,0)
+    costM = np.empty(fpad.shape, fpad.dtype)            # cummulative cost function image
+    costM.fill(limits(f)[1])
+    y = pad4n(markers,Bc,0)
+    initial, = np.where(y.ravel() > 0)
+    costM.flat[initial] = fpad.flat[initial]
     # get 1D displacement neighborhood pixels
-    Bi=se2flatidx(f,Bc)
-    status=status.ravel()
-    f=f.ravel()
-    costM=costM.ravel()
-    yflat=y.ravel()
-
-    initial, = where(yflat > 0)
-    costM[initial]=f[initial]
-    # I sort in order of insertion for the simple reason that that's what
-    # the original code intended to do (although that code was not functional)
-    hqueue=[(costM[idx],i,idx) for i,idx in enumerate(initial)]
-    heapify(hqueue)
-    while hqueue:
-        cost,_,pi = heappop(hqueue)
-        status[pi]=1                                            # make it a permanent label
-        for qi in Bi+pi:                                        # for each neighbor of pi
-            if (status[qi] != 3):                               # not image border
-                if (status[qi] != 1):                           # if not permanent
-                    if is_gvoronoi:
-                        ncost=costM[pi]
-                    else:
-                        ncost=f[qi]
-                    if ncost < costM[qi]:
-                        costM[qi]=ncost
-                        yflat[qi] = yflat[pi]                   # propagate the label
-                        heappush(hqueue,(ncost,i,qi))
-                        i += 1
-                elif (return_lines  and
-                     (yflat[qi] != yflat[pi]) and
-                     (y1flat[qi] == 0)     ):
-                    y1flat[pi] = 1
-    y=y[1:-1,1:-1]
+    Bi = se2flatidx(fpad,Bc).tolist()
+
+    # The flooding visits pixels one at a time, so the buffers are kept as
+    # compact array.array objects, which are cheap to index from Python.
+    status = _pyarray(status)
+    fflat = _pyarray(fpad)
+    costflat = _pyarray(costM)
+    yflat = _pyarray(y)
+    if return_lines:
+        y1flat = _pyarray(np.zeros(fpad.shape, np.uint8))
+
+    # Hierarchical queue: one FIFO per grey level, plus a heap of the levels
+    # which are not empty. Pixels leave in order of cost and, within the same
+    # cost, in order of insertion.
+    queues = {}
+    for idx in initial.tolist():
+        c = costflat[idx]
+        if c not in queues:
+            queues[c] = deque()
+        queues[c].append(idx)
+    levels = queues.keys()
+    heapify(levels)
+    while levels:
+        level = levels[0]
+        queue = queues[level]
+        pi = queue.popleft()
+        if not queue:
+            heappop(levels)
+            del queues[level]
+        status[pi] = 1                                          # make it a permanent label
+        ypi = yflat[pi]
+        for qi in Bi:                                           # for each neighbor of pi
+            qi += pi
+            sq = status[qi]
+            if sq == 3:                                         # image border
+                continue
+            if sq != 1:                                         # if not permanent
+                if is_gvoronoi:
+                    ncost = costflat[pi]
+                else:
+                    ncost = fflat[qi]
+                if ncost < costflat[qi]:
+                    costflat[qi] = ncost
+                    yflat[qi] = ypi                             # propagate the label
+                    queue = queues.get(ncost)
+                    if queue is None:
+                        queue = queues[ncost] = deque()
+                        heappush(levels, ncost)
+                    queue.append(qi)
+            elif (return_lines and
+                 (yflat[qi] != ypi) and
+                 (y1flat[qi] == 0)):
+                y1flat[pi] = 1
+    y = np.frombuffer(yflat, y.dtype).reshape(y.shape)[ch:ch+h, cw:cw+w].copy()
     if return_lines:
-        y1=y1[1:-1,1:-1]
+        y1 = np.frombuffer(y1flat, np.uint8).reshape(fpad.shape)[ch:ch+h, cw:cw+w] != 0
         return y,y1
     return y
 
 
-def dilate(f, B=None):
+def _pyarray(a):
     """
-    y = dilate(f, B={3x3 cross})
+    arr = _pyarray(a)
+
+    Copy of the ndarray `a`, flattened, as an `array.array` of the same
+    item type (binary images become unsigned bytes). Unlike an ndarray, an
+    `array.array` is cheap to index one element at a time from Python.
+    """
+    from array import array
+    from numpy import ascontiguousarray, uint8
+    if isbinary(a): a = a.astype(uint8)
+    return array(a.dtype.char, ascontiguousarray(a).tostring())
+
+
+def dilate(f, B=None, out=None):
+    """
+    y = dilate(f, B={3x3 cross}, out=None)
 
     Dilate an image by a structuring element.
 
@@ -1565,31 +2341,556 @@ def dilate(f, B=None):
 
     Parameters
     ----------
-    f : Gray-scale (uint8 or uint16) or binary image.
+    f : Gray-scale (uint8 or uint16) or binary image, or stack (N,H,W) of
+        images (which are dilated independently).
     B : Structuring element (default: 3x3 cross).
+    out : ndarray of the type of `f`, optional
+        Output array (may be `f` itself).
 
     Returns
     -------
     y: Same type as `f`
     """
-    from numpy import maximum, newaxis, ones, int32
+    from numpy import maximum, newaxis, ones, empty, int32, array, concatenate
     if B is None: B = secross()
     if len(f.shape) == 1: f = f[newaxis,:]
     if isbinary(f): B = asbinary(B)
+    if len(f.shape) == 3:
+        # a flat dilation sees the outside of the image as the minimum, so
+        # the images are dilated at once (by groups of about _batch_pixels
+        # pixels), one above the other, separated by enough rows of minimum
+        x,v = mat2set(B)
+        m = max(_batch_pixels // max(f.shape[1]*f.shape[2],1), 1)
+        if len(x) and not (isbinary(v) or (v == v[0]).all()):
+            y = array([dilate(fi, B) for fi in f], f.dtype).reshape(f.shape)
+        elif len(f) > m:
+            y = concatenate([dilate(f[i:i+m], B) for i in xrange(0,len(f),m)])
+        else:
+            y = _unstack(dilate(_stack(f, _se_rows(x), limits(f)[0]), B), f.shape)
+        if out is not None:
+            out[...] = y
+            return out
+        return y
     h,w = f.shape
     x,v = mat2set(B)
     if len(x)==0:
         y = (ones((h,w),int32) * limits(f)[0]).astype(f.dtype)
+    elif isbinary(f):
+        y = _unpack(_packed_dilate(_pack(f), w, x), w)
+    elif isbinary(v) or (v == v[0]).all():
+        # flat, or constant (where dilation commutes with adding the constant)
+        y = _flat_dilate(f, x)
+        if not isbinary(v):
+            add4dilate(y, v[0], y)
     else:
         if isbinary(v):
             v = intersec(gray(v,'int32'),0)
         mh,mw = max(abs(x)[:,0]),max(abs(x)[:,1])
         y = (ones((h+2*mh,w+2*mw),int32) * limits(f)[0]).astype(f.dtype)
+        t = empty((h,w), f.dtype)
         for i in xrange(x.shape[0]):
             if v[i] > -2147483647:
-                y[mh+x[i,0]:mh+x[i,0]+h, mw+x[i,1]:mw+x[i,1]+w] = maximum(
-                    y[mh+x[i,0]:mh+x[i,0]+h, mw+x[i,1]:mw+x[i,1]+w], add4dilate(f,v[i]))
+                yi = y[mh+x[i,0]:mh+x[i,0]+h, mw+x[i,1]:mw+x[i,1]+w]
+                maximum(yi, add4dilate(f,v[i],t), yi)
         y = y[mh:mh+h, mw:mw+w]
+    if out is not None:
+        out[...] = y
+        return out
+    return y
+
+
+# stacks of images are processed in groups of about this many pixels
+_batch_pixels = 2**20
+
+def _se_rows(x):
+    """
+    r = _se_rows(x)
+
+    Largest vertical distance between the origin and the offsets `x` (as
+    returned by `mat2set`).
+    """
+    return (int(abs(x[:,0]).max()) if len(x) else 0)
+
+
+def _stack(f, gap, fill):
+    """
+    S = _stack(f, gap, fill)
+
+    The images of the stack `f` (N,H,W) one above the other in a single
+    2-D image, each one followed by `gap` rows of `fill`.
+    """
+    import numpy as np
+    N,h,w = f.shape
+    S = np.empty((N,h+gap,w), f.dtype)
+    S[:,:h] = f
+    S[:,h:] = fill
+    return S.reshape((N*(h+gap),w))
+
+
+def _unstack(S, shape):
+    """
+    f = _unstack(S, shape)
+
+    Inverse of `_stack`: the stack of `shape` (N,H,W) stacked in `S`.
+    """
+    import numpy as np
+    N,h,w = shape
+    if not N:
+        return np.empty(shape, S.dtype)
+    return S.reshape((N,-1,w))[:,:h].copy()
+
+
+def _flat_dilate(f, x):
+    """
+    y = _flat_dilate(f, x)
+
+    Dilation of `f` by the flat structuring element with offsets `x`.
+
+    Rectangles (including horizontal and vertical lines) are decomposed into
+    a horizontal and a vertical running maximum, and diagonal lines become
+    vertical lines after shearing the image. The running maxima use the van
+    Herk/Gil-Werman algorithm, whose cost does not depend on the length of
+    the structuring element. Any other shape is dilated point by point.
+
+    Parameters
+    ----------
+    f : 2-D image
+    x : array of (dy,dx) offsets (as returned by `mat2set`)
+
+    Returns
+    -------
+    y : Image of same type as `f`
+    """
+    import numpy as np
+    fill = limits(f)[0]
+    h,w = f.shape
+    dy,dx = x[:,0], x[:,1]
+    r0,r1 = dy.min(), dy.max()
+    c0,c1 = dx.min(), dx.max()
+    if len(x) == (r1-r0+1)*(c1-c0+1):
+        # offsets are distinct, so this is the full rectangle
+        y = _running_max(f, c0, c1, fill)
+        return _running_max(y.T, r0, r1, fill).T.copy()
+    if len(x) == (r1-r0+1):
+        for s in (+1,-1):
+            k = dx - s*dy
+            if (k == k[0]).all():
+                if h > w:
+                    # the sheared image has w+h-1 columns: shear the transpose
+                    # of tall images (such as stacks) instead
+                    return _flat_dilate(f.T, x[:,::-1]).T.copy()
+                # diagonal line: offsets (t, s*t + k). In the image sheared
+                # by c' = c - s*r, this is a vertical line shifted by k.
+                rows = np.arange(h)[:,np.newaxis]
+                cols = np.arange(w)[np.newaxis,:] - s*rows
+                if s == 1: cols += h-1
+                S = np.empty((h,w+h-1), f.dtype)
+                S.fill(fill)
+                S[rows,cols] = f
+                S = _running_max(S, k[0], k[0], fill)
+                S = _running_max(S.T, r0, r1, fill).T
+                return S[rows,cols]
+    y = np.empty((h,w), f.dtype)
+    y.fill(fill)
+    for oy,ox in x:
+        src, dst = _shift_slices((h,w), oy, ox)
+        np.maximum(y[dst], f[src], y[dst])
+    return y
+
+
+def _running_max(f, d0, d1, fill):
+    """
+    y = _running_max(f, d0, d1, fill)
+
+    ``y[:,i] = max(f[:,i-d1], ..., f[:,i-d0])`` (pixels outside the image
+    have value `fill`).
+
+    Uses the van Herk/Gil-Werman algorithm: the row is cut in blocks of the
+    window length, and each window maximum is the maximum of a suffix
+    maximum and a prefix maximum, independently of the window length.
+    """
+    import numpy as np
+    h,n = f.shape
+    k = d1 - d0 + 1
+    P = max(d1, 0)
+    Q = max(-d0, 0)
+    m = n + P + Q
+    nblocks = -(-m // k)
+    g = np.empty((h, nblocks*k), f.dtype)
+    g.fill(fill)
+    g[:,P:P+n] = f
+    start = P - d1
+    if k <= 3:
+        y = g[:,start:start+n].copy()
+        for i in xrange(1,k):
+            np.maximum(y, g[:,start+i:start+i+n], y)
+        return y
+    blocks = g.reshape((h, nblocks, k))
+    suffix = np.maximum.accumulate(blocks[:,:,::-1], axis=2)[:,:,::-1].reshape((h, nblocks*k))
+    prefix = np.maximum.accumulate(blocks, axis=2).reshape((h, nblocks*k))
+    return np.maximum(suffix[:,start:start+n], prefix[:,start+k-1:start+k-1+n])
+
+
+def _pack(f):
+    """
+    P = _pack(f)
+
+    Pack a binary image into rows of 64-bit words.
+
+    Pixel ``(r,c)`` is bit ``63 - c%64`` of word ``P[r,c//64]`` (the
+    first pixel of a word is its most significant bit). The padding bits
+    after the last column are zero; all the `_packed_*` functions keep
+    them that way.
+    """
+    import numpy as np
+    if f.ndim == 1: f = f[np.newaxis,:]
+    h,w = f.shape
+    nw = -(-w // 64)
+    b = np.zeros((h, nw*8), np.uint8)
+    b[:,:(w+7)//8] = np.packbits(f, axis=1)
+    return b.view('>u8').astype(np.uint64)
+
+
+def _unpack(P, w):
+    """
+    f = _unpack(P, w)
+
+    Inverse of `_pack`: binary image of width `w`.
+    """
+    import numpy as np
+    b = P.astype('>u8').view(np.uint8)
+    return np.unpackbits(b, axis=1)[:,:w].view(bool)
+
+
+def _packed_tail(w):
+    """
+    m = _packed_tail(w)
+
+    Word with the bits of the last word that are not pixels of an image of
+    width `w` set.
+    """
+    import numpy as np
+    if w % 64 == 0: return np.uint64(0)
+    return ~np.uint64(0) >> np.uint64(w % 64)
+
+
+def _packed_neg(P, w):
+    """
+    y = _packed_neg(P, w)
+
+    Complement of a packed image.
+    """
+    y = ~P
+    y[:,-1] &= ~_packed_tail(w)
+    return y
+
+
+def _packed_dilate(P, w, x):
+    """
+    y = _packed_dilate(P, w, x)
+
+    Dilation of the packed image `P` (of width `w`) by the flat
+    structuring element with offsets `x`: the union of its translations.
+    """
+    return _packed_translations(P, w, x, False)
+
+
+def _packed_erode(P, w, x):
+    """
+    y = _packed_erode(P, w, x)
+
+    Erosion of the packed image `P` (of width `w`): the intersection of its
+    translations by the offsets `x` of the *reflected* structuring element.
+    Pixels outside the image are taken as 1, as in `erode`.
+    """
+    return _packed_translations(P, w, x, True)
+
+
+def _packed_supgen(P, w, xa, xb):
+    """
+    y = _packed_supgen(P, w, xa, xb)
+
+    Sup-generating operator on a packed image; `xa` and `xb` are the
+    offsets of the reflected `A` and `Bc` of the interval.
+    """
+    y = _packed_erode(P, w, xa)
+    y &= _packed_erode(_packed_neg(P, w), w, xb)
+    return y
+
+
+def _erosion_offsets(B):
+    """
+    x = _erosion_offsets(B)
+
+    Offsets used by `_packed_erode` to erode by the binary structuring
+    element `B`.
+    """
+    return mat2set(sereflect(asbinary(B)))[0]
+
+
+_packed_intervals_cache = {}
+
+def _packed_intervals(Iab, theta, direction, reflected=False):
+    """
+    rots = _packed_intervals(Iab, theta, direction, reflected=False)
+
+    ``(xa,xb)`` erosion offsets of the rotations of `Iab` by multiples of
+    `theta`, as used by `_packed_supgen` and `_packed_hmt` (the erosion
+    offsets of the reflected intervals, if `reflected`).
+
+    The rotations are computed once for each interval, and remembered.
+    """
+    from string import lower
+    A,Bc = Iab
+    key = (A.shape, A.dtype.str, A.tostring(), Bc.shape, Bc.dtype.str, Bc.tostring(),
+            theta, lower(direction), reflected)
+    rots = _packed_intervals_cache.get(key)
+    if rots is None:
+        rots = []
+        for t in xrange(0,360,theta):
+            Ar,Bcr = interot(Iab, t, direction)
+            if reflected:
+                rots.append((mat2set(asbinary(Ar))[0], mat2set(asbinary(Bcr))[0]))
+            else:
+                rots.append((_erosion_offsets(Ar), _erosion_offsets(Bcr)))
+        if len(_packed_intervals_cache) > 256: _packed_intervals_cache.clear()
+        _packed_intervals_cache[key] = rots
+    return rots
+
+
+def _packed_iterate(y, w, rots, n, thinning, G=None):
+    """
+    y = _packed_iterate(y, w, rots, n, thinning, G=None)
+
+    At most `n` passes of thinning (thickening, if not `thinning`) of the
+    packed image `y` by the intervals `rots`, in turn, stopping when a
+    pass changes nothing. If `G` is given, the result of each step is
+    conditioned to it (union for thinning, intersection for thickening).
+
+    The image is cut in tiles that remember the last step that changed
+    them, and an interval is only evaluated on the tiles next to a change
+    made since its own last evaluation (elsewhere its hit-or-miss is known
+    to be empty). The tiles to evaluate are gathered, with a halo, side by
+    side in a single array. To this end, the image is kept in a frame whose
+    bits are 1 both in the image and in its complement, as the outside of
+    the image is for `_packed_erode`.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import as_strided
+    h,nw = y.shape
+    R,Q = 0,1
+    for xa,xb in rots:
+        for x in (xa,xb):
+            if len(x):
+                R = max(R, abs(x[:,0]).max())
+                Q = max(Q, abs(x[:,1]).max()//64 + 1)
+    TR,TW = max(16,R), max(2,Q)
+    nr,nc = -(-h//TR), -(-nw//TW)
+    ones = ~np.uint64(0)
+    tail = _packed_tail(w)
+    E = np.empty((nr*TR + 2*R, nc*TW + 2*Q), np.uint64)
+    E.fill(ones)
+    E[R:R+h, Q:Q+nw] = y
+    E[R:R+h, Q+nw-1] |= tail
+    M = np.empty(E.shape, np.uint64)
+    M.fill(ones)
+    M[R:R+h, Q:Q+nw] = 0
+    M[R:R+h, Q+nw-1] = tail
+    if G is not None:
+        GE = M.copy()
+        GE[R:R+h, Q:Q+nw] |= G
+    # (tile row, tile column, row, word) views of the tiles and their halos
+    s0,s1 = E.strides
+    halo = lambda A: as_strided(A, (nr,nc,TR+2*R,TW+2*Q), (TR*s0,TW*s1,s0,s1))
+    core = lambda A: halo(A)[:,:,R:R+TR,Q:Q+TW]
+    stamp = np.zeros((nr,nc), np.intp)
+    last = [0]*len(rots)
+    step = 0
+    for i in xrange(n):
+        changed = False
+        for j,(xa,xb) in enumerate(rots):
+            # tiles next to a tile changed since this interval was last done
+            D = np.zeros((nr+2,nc+2), bool)
+            d = (stamp >= last[j])
+            for dy in (0,1,2):
+                for dx in (0,1,2):
+                    D[dy:dy+nr, dx:dx+nc] |= d
+            ti,tj = np.nonzero(D[1:-1,1:-1])
+            step += 1
+            last[j] = step
+            if not len(ti): continue
+            full = (2*len(ti) > nr*nc)
+            if full:
+                T,Tm = E,M
+            else:
+                # side by side, so that the rows of T are long
+                T = halo(E)[ti,tj].swapaxes(0,1).reshape((TR+2*R,-1))
+                Tm = halo(M)[ti,tj].swapaxes(0,1).reshape((TR+2*R,-1))
+            Tn = np.invert(T)
+            Tn |= Tm
+            sup = _packed_translations(T, 64*T.shape[1], xa, True)
+            sup &= _packed_translations(Tn, 64*T.shape[1], xb, True)
+            sup &= ~Tm
+            if full:
+                prev = E.copy()
+                ys = E
+            else:
+                sup = sup.reshape((TR+2*R,len(ti),TW+2*Q)).swapaxes(0,1)[:,R:R+TR,Q:Q+TW]
+                ys = core(E)[ti,tj]
+                prev = ys.copy()
+            if thinning:
+                ys &= np.invert(sup, sup)
+                if G is not None: ys |= (GE if full else core(GE)[ti,tj])
+            else:
+                ys |= sup
+                if G is not None: ys &= (GE if full else core(GE)[ti,tj])
+            if full:
+                ch = (E != prev)[R:R+nr*TR].reshape((nr,TR,-1)).any(1)
+                ch = ch[:,Q:Q+nc*TW].reshape((nr,nc,TW)).any(2)
+                stamp[ch] = step
+            else:
+                ch = (ys != prev).reshape((len(ti),-1)).any(1)
+                if ch.any():
+                    core(E)[ti[ch],tj[ch]] = ys[ch]
+                stamp[ti[ch],tj[ch]] = step
+            changed = changed or ch.any()
+        if not changed: break
+    if _iterations_hook is not None: _iterations_hook(i+1 if n > 0 else 0)
+    y[...] = E[R:R+h, Q:Q+nw]
+    y[:,-1] &= ~tail
+    return y
+
+
+def _packed_translations(P, w, x, erosion):
+    """
+    y = _packed_translations(P, w, x, erosion)
+
+    Union (intersection, if `erosion`) of the translations of `P` by the
+    offsets `x`. Rectangles are done as a row pass followed by a column
+    pass.
+    """
+    import numpy as np
+    h,nw = P.shape
+    tail = _packed_tail(w)
+    if len(x) == 0:
+        y = np.zeros((h,nw), np.uint64)
+        if erosion: y = _packed_neg(y, w)
+        return y
+    dy,dx = x[:,0], x[:,1]
+    r0,r1 = dy.min(), dy.max()
+    c0,c1 = dx.min(), dx.max()
+    if r0 != r1 and c0 != c1 and len(x) == (r1-r0+1)*(c1-c0+1):
+        rows = np.array([(0,c) for c in xrange(c0,c1+1)])
+        cols = np.array([(r,0) for r in xrange(r0,r1+1)])
+        return _packed_translations(_packed_translations(P, w, rows, erosion), w, cols, erosion)
+
+    E = _packed_frame(P, w, x, erosion)
+    y = np.empty((h,nw), np.uint64)
+    t = np.empty((h,nw), np.uint64)
+    u = np.empty((h,nw), np.uint64)
+    op = (np.bitwise_and if erosion else np.bitwise_or)
+    for i,(oy,ox) in enumerate(x):
+        s = _packed_shift(E, (h,nw), oy, ox, t, u)
+        if i == 0:
+            y[...] = s
+        else:
+            op(y, s, y)
+    y[:,-1] &= ~tail
+    return y
+
+
+def _packed_frame(P, w, x, fill):
+    """
+    E = _packed_frame(P, w, x, fill)
+
+    `P` with a frame of words around it (and padding bits) that are all 1
+    if `fill` and 0 otherwise, large enough for `_packed_shift` to
+    translate it by any of the offsets `x`.
+    """
+    import numpy as np
+    h,nw = P.shape
+    my = abs(x[:,0]).max()
+    mq = abs(x[:,1]).max() // 64 + 1
+    E = np.empty((h + 2*my, nw + 2*mq), np.uint64)
+    E.fill(~np.uint64(0) if fill else np.uint64(0))
+    E[my:my+h, mq:mq+nw] = P
+    if fill: E[my:my+h, mq+nw-1] |= _packed_tail(w)
+    return E
+
+
+def _packed_shift(E, shape, oy, ox, t, u):
+    """
+    s = _packed_shift(E, shape, oy, ox, t, u)
+
+    Translation by ``(oy,ox)`` of the image of shape `shape` framed in `E`
+    (by `_packed_frame`): ``s[r,c] = P[r-oy,c-ox]``. `t` and `u` are
+    scratch arrays of `shape`; `s` is either `t` or a view of `E`.
+    """
+    import numpy as np
+    h,nw = shape
+    my = (E.shape[0] - h)//2
+    mq = (E.shape[1] - nw)//2
+    rows = E[my-oy:my-oy+h]
+    q,b = divmod(abs(ox), 64)
+    if ox >= 0:
+        # pixel c comes from c - ox: shift towards the less significant bits
+        s = rows[:, mq-q:mq-q+nw]
+        if b:
+            np.right_shift(s, np.uint64(b), t)
+            np.left_shift(rows[:, mq-q-1:mq-q-1+nw], np.uint64(64 - b), u)
+            s = np.bitwise_or(t, u, t)
+    else:
+        s = rows[:, mq+q:mq+q+nw]
+        if b:
+            np.left_shift(s, np.uint64(b), t)
+            np.right_shift(rows[:, mq+q+1:mq+q+1+nw], np.uint64(64 - b), u)
+            s = np.bitwise_or(t, u, t)
+    return s
+
+
+def _packed_hmt(P, w, rots, N=None):
+    """
+    y = _packed_hmt(P, w, rots, N=None)
+
+    Union of the sup-generating (hit-or-miss) transforms of the packed
+    image `P` by the intervals `rots` (``(xa,xb)`` erosion offsets, as
+    given by `_packed_intervals`). `N` is the complement of `P` (computed
+    if not given).
+
+    Each interval is the conjunction of some translations of `P` and of
+    `N`: every translation is computed once for all the intervals, so the
+    8 rotations of a 3x3 interval cost at most 9 translations of each
+    image (instead of 56 for the 8 erosions). A single interval is better
+    served by `_packed_supgen`.
+    """
+    import numpy as np
+    h,nw = P.shape
+    xs = [x for xa,xb in rots for x in (xa,xb) if len(x)]
+    if N is None: N = _packed_neg(P, w)
+    y = np.zeros((h,nw), np.uint64)
+    if xs:
+        x = np.concatenate(xs)
+        E = (_packed_frame(P, w, x, True), _packed_frame(N, w, x, True))
+    planes = {}
+    t = np.empty((h,nw), np.uint64)
+    u = np.empty((h,nw), np.uint64)
+    for xa,xb in rots:
+        hit = None
+        for k,x in enumerate((xa,xb)):
+            for oy,ox in x:
+                s = planes.get((k,oy,ox))
+                if s is None:
+                    s = _packed_shift(E[k], (h,nw), oy, ox, t, u)
+                    s = planes[k,oy,ox] = (s.copy() if s is t else s)
+                if hit is None:
+                    hit = s.copy()
+                else:
+                    hit &= s
+        if hit is None:
+            y.fill(~np.uint64(0))
+            break
+        y |= hit
+    y[:,-1] &= ~_packed_tail(w)
     return y
 
 
@@ -1752,9 +3053,9 @@ def endpoints(option="loop"):
     return None
 
 
-def erode(f, b=None):
+def erode(f, b=None, out=None):
     """
-    y = erode(f, b={3x3 cross})
+    y = erode(f, b={3x3 cross}, out=None)
 
     Erode an image by a structuring element.
 
@@ -1768,8 +3069,11 @@ def erode(f, b=None):
 
     Parameters
     ----------
-    f : Gray-scale (uint8 or uint16) or binary image.
+    f : Gray-scale (uint8 or uint16) or binary image, or stack (N,H,W) of
+        images (which are eroded independently).
     b : Structuring element (Default: 3x3 elementary cross).
+    out : ndarray of the type of `f`, optional
+        Output array (may be `f` itself).
 
     Returns
     -------
@@ -1780,10 +3084,116 @@ def erode(f, b=None):
     mahotas.erode : implementation of binary erosion
     scipy.ndimage.grey_erosion : implementation of grey erosion
     """
+    from numpy import newaxis
 
     if b is None: b = secross()
-    return neg(dilate(neg(f),sereflect(b)))
+    if isbinary(f):
+        if len(f.shape) == 1: f = f[newaxis,:]
+        if len(f.shape) == 3:
+            # the outside of the images is 1 for the erosion
+            y = _unstack(erode(_stack(f, _se_rows(mat2set(b)[0]), True), b), f.shape)
+        else:
+            y = _unpack(_packed_erode(_pack(f), f.shape[1], _erosion_offsets(b)), f.shape[1])
+        if out is not None:
+            out[...] = y
+            return out
+        return y
+    y = neg(f)
+    y = dilate(y, sereflect(b), y)
+    return neg(y, (y if out is None else out))
+
+
+def flood(f, T, option, Bc=None):
+    """
+    y = flood(f, T, option, Bc={3x3 cross})
 
+    Flooding filter: h, area and volume basins, and their dynamics.
+
+    `flood` fills each basin of `f` with a lake that rises until its
+    depth ('H'), its area ('AREA') or its volume ('VOLUME') reaches `T`.
+    Lakes that meet merge, and the merged lake goes on rising. These
+    filters are the h-basin (`hmin`), the area closing (`areaclose`) and
+    the volume closing, respectively. No lake rises above the largest
+    value of the type of `f`.
+
+    If `T` is negative, the generalized dynamics of the basins are computed
+    instead. Each regional minimum gets the criterion of its lake at the
+    level where the lake merges with the lake of a deeper basin (or, for
+    the deepest one, floods the whole image). All the other pixels are 0.
+
+    The min-tree of `f` is built once. Its construction accumulates the
+    area, the sum of the values and the deepest pixel of each node. A
+    pixel is then flooded to the lowest level at which the lake of one of
+    its nodes stops.
+
+    Parameters
+    ----------
+    f :      Gray-scale image (uint8, uint16 or int32).
+    T :      Criterion value, or a negative value for the dynamics.
+    option : {'AREA', 'VOLUME', 'H'}
+        Criterion (case insensitive).
+    Bc :     Structuring element (default: 3x3 cross).
+
+    Returns
+    -------
+    y : Gray-scale image (same type as `f`), saturated to the largest
+        value of its type.
+    """
+    import numpy as np
+    from string import upper
+    if Bc is None: Bc = secross()
+    option = upper(option)
+    if option not in ('AREA', 'VOLUME', 'H'):
+        raise ValueError, "pymorph.flood: option must be one of 'AREA', 'VOLUME', 'H'"
+    if len(f.shape) == 1: f = f[np.newaxis,:]
+    hi = int(limits(f)[1])
+    F = f.ravel().astype(np.int64)
+    # the min-tree of f is the max-tree of -f
+    parent, S, area, total, deepest = _maxtree(-F.reshape(f.shape), Bc, values=True)
+    pixels = np.arange(F.size)
+    root = (parent == pixels)
+    # the pixel of a node whose parent is in another node holds its attributes
+    node = (F[parent] != F) | root
+    low = F[deepest]
+    volume = area*F + total
+    if T < 0:
+        # c: the pixel holding the attributes of the node of each pixel
+        c = np.where(node, pixels, parent)
+        while True:
+            nc = c[c]
+            if np.all(nc == c): break
+            c = nc
+        # the lake of the basin of deepest[n] ends at the level of the parent
+        # node of n, if the deepest pixel of the parent is in another basin
+        up = c[parent]
+        ends = np.flatnonzero(node & ((deepest[up] != deepest) | root))
+        level = F[up[ends]]
+        if option == 'H':
+            dyn = level - low[ends]
+        elif option == 'AREA':
+            dyn = area[ends]
+        else:
+            dyn = volume[ends] + area[ends]*(level - F[ends])
+        y = np.zeros(F.size, np.int64)
+        y[deepest[ends]] = np.minimum(dyn, hi)
+        y = np.where(F == low[c], y[deepest[c]], 0)
+        return y.reshape(f.shape).astype(f.dtype)
+    # the level at which the lake of each node stops
+    if option == 'H':
+        stop = np.maximum(F, low + T)
+    elif option == 'AREA':
+        stop = np.where(area >= T, F, hi)
+    else:
+        stop = np.where(volume >= T, F, F + (T - volume + area - 1)//area)
+    y = np.where(node, np.minimum(stop, hi), hi)
+    # lowest stop among the ancestors, by pointer doubling
+    up = parent
+    while True:
+        np.minimum(y, y[up], y)
+        nup = up[up]
+        if np.all(nup == up): break
+        up = nup
+    return y.reshape(f.shape).astype(f.dtype)
 
 
 def gdist(f, g, Bc=None, metric=None):
@@ -1817,19 +3227,15 @@ def gdist(f, g, Bc=None, metric=None):
     y : uint16 (distance image).
     """
 
+    from numpy import uint16
+
     if Bc is None: Bc = secross()
     assert metric is None,'Does not support euclidean'
-    fneg,gneg = neg(f),neg(g)
-    y = gray(gneg,'uint16',1)
-    ero = intersec(y,0)
-    prev = y
-    i = 1
-    while not isequal(ero, prev):
-        prev = ero
-        ero = cerode(gneg,fneg,Bc,i)
-        y = addm(y,gray(ero,'uint16',1))
-        i += 1
-    return union(y,gray(ero,'uint16'))
+    # the pixels reached by the i-th conditional dilation of g are at distance i
+    reached, t = _frontier_cdilate(intersec(f,g), f, sereflect(Bc), -1, passes=True)
+    y = t.clip(0, 65535).astype(uint16)
+    y[~reached] = 65535
+    return y
 
 
 def gradm(f, Bdil=None, Bero=None):
@@ -1893,6 +3299,12 @@ def grain(f, labels, measurement, option="image"):
     -------
     y: Gray-scale (uint8 or uint16) image.
         Or an array with gray-scale statistics per region
+
+    Notes
+    -----
+    'std' is the standard deviation normalised by the number of pixels,
+    'std1' by the number of pixels minus one (0 for single pixel regions).
+    Labels without any pixel get 0.
     """
     """
         - Examples
@@ -1914,41 +3326,78 @@ def grain(f, labels, measurement, option="image"):
             show(f)
             show(g)
     """
-    from numpy import zeros_like, asarray, zeros, float32
+    from numpy import asarray, zeros
     from string import lower
 
     measurement = lower(measurement)
+    assert measurement in ('max', 'min', 'median', 'mean', 'sum', 'std', 'std1'), \
+        'pymorph.grain: Unknown measurement type \'%s\'' % measurement
     is_data = (lower(option) == 'data')
+    labels = asarray(labels)
+    n = int(labels.max()) if labels.size else 0
+    if n <= 0:
+        if is_data: return asarray([])
+        return zeros(labels.shape)
+    values = _grouped_stats(asarray(f).ravel(), labels.ravel(), n, measurement)
     if is_data:
-        y = []
+        return values
+    lut = zeros(n+1)
+    lut[1:] = values
+    return lut[labels]
+
+
+def _grouped_stats(values, labels, n, measurement):
+    """
+    y = _grouped_stats(values, labels, n, measurement)
+
+    `measurement` of the `values` of each label ``1..n`` (see `grain`),
+    computed for all labels at once: sums, means and standard deviations
+    with `bincount`, the order statistics after a single sort by label.
+
+    Parameters
+    ----------
+    values : 1-D array
+    labels : 1-D integer array (labels outside ``1..n`` are ignored)
+    n : number of labels
+    measurement : one of 'max', 'min', 'median', 'mean', 'sum', 'std', 'std1'
+
+    Returns
+    -------
+    y : array of length `n` (0 for labels without any value)
+    """
+    import numpy as np
+    inside = (labels > 0) & (labels <= n)
+    if not inside.all():
+        values = values[inside]
+        labels = labels[inside]
+    counts = np.bincount(labels, minlength=n+1)[1:]
+    present = counts > 0
+    if measurement in ('sum', 'mean', 'std', 'std1'):
+        sums = np.bincount(labels, values, n+1)[1:]
+        if measurement == 'sum':
+            return sums.astype(np.zeros(1, values.dtype).sum().dtype)
+        mean = sums / counts.clip(1)
+        if measurement == 'mean':
+            return mean
+        dev = values - mean[labels-1]
+        ss = np.bincount(labels, dev*dev, n+1)[1:]
+        if measurement == 'std':
+            return np.sqrt(ss / counts.clip(1))
+        return np.sqrt(ss / (counts-1).clip(1))
+    y = np.zeros(n, values.dtype if measurement != 'median' else np.float64)
+    order = np.lexsort((values, labels))
+    s = values[order]
+    ends = np.cumsum(counts)[present]
+    starts = ends - counts[present]
+    if measurement == 'min':
+        y[present] = s[starts]
+    elif measurement == 'max':
+        y[present] = s[ends-1]
     else:
-        type = f.dtype
-        if measurement in ('mean', 'std'):
-            type = float32
-        y = zeros(labels.shape)
-    fdata = f.ravel()
-    labelsravel = labels.ravel()
-    for obj_id in xrange(labelsravel.max()):
-        pixels = fdata[labelsravel == (obj_id + 1)]
-        if measurement == 'max':
-            val = pixels.max()
-        elif measurement == 'min':
-            val = pixels.min()
-        elif measurement == 'sum':
-            val = pixels.sum()
-        elif measurement == 'mean':
-            val = pixels.mean()
-        elif measurement == 'std':
-            val = pixels.std()
-        elif measurement == 'std1':
-            print "'std1' is not implemented"
-        else:
-            print "measurement should be 'max', 'min', 'mean', 'sum', 'std', 'std1'."
-        if is_data:
-            y.append(val)
-        else:
-            y += val*(labels == (obj_id+1))
-    return asarray(y)
+        lo = s[(starts + ends - 1) // 2].astype(np.float64)
+        hi = s[(starts + ends) // 2].astype(np.float64)
+        y[present] = (lo + hi) / 2
+    return y
 
 
 def gray(f, dtype="uint8", k=None):
@@ -2184,6 +3633,12 @@ def infcanon(f, Iab, theta=45, direction='clockwise'):
     from string import upper
 
     direction = upper(direction)
+    if isbinary(f):
+        # infgen(f,(A,Bc)) is the complement of supgen(neg(f),(A',Bc'))
+        w = f.shape[-1]
+        rots = _packed_intervals(Iab, theta, direction, True)
+        N = _pack(f)
+        return _unpack(_packed_neg(_packed_hmt(_packed_neg(N, w), w, rots, N), w), w)
     y = union(f,1)
     for t in xrange(0,360,theta):
         Irot = interot(Iab, t, direction)
@@ -2212,6 +3667,12 @@ def infgen(f, Iab):
     """
 
     A,Bc = Iab
+    if isbinary(f):
+        P = _pack(f)
+        w = f.shape[-1]
+        y = _packed_dilate(P, w, mat2set(asbinary(A))[0])
+        y |= _packed_dilate(_packed_neg(P, w), w, mat2set(asbinary(Bc))[0])
+        return _unpack(y, w)
     return union(dilate(f, A),dilate(neg(f), Bc))
 
 
@@ -2262,8 +3723,142 @@ def infrec(f, g, Bc=None):
         show(y)
     """
     if Bc is None: Bc = secross()
-    n = f.size
-    return cdilate(f, g, Bc, n);
+    return _reconstruct(f, g, Bc)
+
+
+def _clip_to(g, f):
+    """
+    g = _clip_to(g, f)
+
+    `g` clipped to `limits(f)`, in the type of `f`.
+    """
+    import numpy as np
+    g = np.asarray(g)
+    if g.dtype != f.dtype:
+        k1,k2 = limits(f)
+        g = np.minimum(np.maximum(g, k1), k2).astype(f.dtype)
+    return g
+
+
+def _reconstruct(f, g, Bc):
+    """
+    y = _reconstruct(f, g, Bc)
+
+    Inf-reconstruction of `g` from the marker `f`.
+
+    This is the hybrid algorithm of Vinc:93b: a raster scan and an
+    anti-raster scan propagate values along most geodesic paths, and a FIFO
+    queue, initialised with the pixels that can still propagate, finishes the
+    job. The queue is processed in waves, all pixels of a wave at once.
+
+    The result is the same as iterating ``intersec(dilate(y, Bc), g)`` until
+    stability.
+
+    Parameters
+    ----------
+    f :  Marker image (gray or binary).
+    g :  Conditioning image (gray or binary).
+    Bc : Connectivity Structuring element.
+
+    Returns
+    -------
+    y : Image (same type as `f`).
+    """
+    import numpy as np
+    y = intersec(f, g)
+    shape = y.shape
+    if len(shape) == 1: y = y[np.newaxis,:]
+    y = np.array(y)
+    g = np.ascontiguousarray(_clip_to(g, y)).reshape(y.shape)
+    x,_ = mat2set(Bc)
+    offsets = [(int(dy),int(dx)) for dy,dx in x if (dy,dx) != (0,0)]
+    if not offsets:
+        return y.reshape(shape)
+    h,w = y.shape
+
+    def propagate_row(r, rows):
+        # values flow from p to p+(dy,dx): row r receives from row r-dy
+        row = y[r]
+        acc = None
+        for dy,dx in rows:
+            if not (0 <= r-dy < h) or abs(dx) >= w: continue
+            src = y[r-dy]
+            if acc is None:
+                acc = row.copy()
+            if dx >= 0:
+                np.maximum(acc[dx:], src[:w-dx], acc[dx:])
+            else:
+                np.maximum(acc[:w+dx], src[-dx:], acc[:w+dx])
+        if acc is not None:
+            np.minimum(acc, g[r], row)
+
+    down = [(dy,dx) for dy,dx in offsets if dy > 0]
+    up = [(dy,dx) for dy,dx in offsets if dy < 0]
+    for r in xrange(h):
+        propagate_row(r, down)
+        if (0,1) in offsets:
+            _clamp_scan(y[r], g[r])
+    for r in xrange(h-1,-1,-1):
+        propagate_row(r, up)
+        if (0,-1) in offsets:
+            _clamp_scan(y[r,::-1], g[r,::-1])
+
+    active = np.zeros(y.shape, bool)
+    for dy,dx in offsets:
+        src, dst = _shift_slices(y.shape, dy, dx)
+        active[src] |= (np.minimum(y[src], g[dst]) > y[dst])
+    yflat = y.ravel()
+    gflat = g.ravel()
+    frontier = np.flatnonzero(active)
+    waves = 0
+    while frontier.size:
+        waves += 1
+        py, px = divmod(frontier, w)
+        values = yflat[frontier]
+        changed = []
+        for dy,dx in offsets:
+            qy = py + dy
+            qx = px + dx
+            inside = (qy >= 0) & (qy < h) & (qx >= 0) & (qx < w)
+            q = qy[inside]*w + qx[inside]
+            v = np.minimum(values[inside], gflat[q])
+            grow = (v > yflat[q])
+            q = q[grow]
+            if q.size:
+                v = v[grow]
+                order = v.argsort(kind='mergesort') # largest value is written last
+                yflat[q[order]] = v[order]
+                changed.append(q)
+        if not changed:
+            break
+        frontier = np.unique(np.concatenate(changed))
+    if _iterations_hook is not None: _iterations_hook(2 + waves)
+    return y.reshape(shape)
+
+
+def _clamp_scan(lo, hi):
+    """
+    _clamp_scan(lo, hi)
+
+    In-place forward propagation ``lo[i] = min(hi[i], max(lo[i], lo[i-1]))``
+    along a row (assumes ``lo <= hi``).
+
+    Each step is the clamp of its input to ``[lo[i], hi[i]]`` and clamps are
+    closed under composition, so this is computed as a parallel prefix scan
+    in log2(len(lo)) vectorised steps.
+    """
+    from numpy import maximum, minimum
+    n = len(lo)
+    a = lo.copy()
+    b = hi.copy()
+    d = 1
+    while d < n:
+        na = minimum(b[d:], maximum(a[d:], a[:-d]))
+        nb = minimum(b[d:], maximum(a[d:], b[:-d]))
+        a[d:] = na
+        b[d:] = nb
+        d *= 2
+    lo[:] = a
 
 
 def inpos(f, g, Bc=None):
@@ -2336,9 +3931,9 @@ def interot(Iab, theta=45, direction="clockwise"):
     return Irot
 
 
-def intersec(f1, f2, f3=None, f4=None, f5=None):
+def intersec(f1, f2, f3=None, f4=None, f5=None, out=None):
     """
-    y = intersec(f1, f2, f3=None, f4=None, f5=None)
+    y = intersec(f1, f2, f3=None, f4=None, f5=None, out=None)
 
     Intersection of images.
 
@@ -2354,6 +3949,10 @@ def intersec(f1, f2, f3=None, f4=None, f5=None):
     f3 : Image (gray or binary) or constant, optional.
     f4 : Image (gray or binary) or constant, optional.
     f5 : Image (gray or binary) or constant, optional.
+    out : ndarray, optional
+        Output array (may be one of the inputs). Its type is the type of
+        the result (the type of `f1`, or binary if all the inputs are
+        binary).
 
     Returns
     -------
@@ -2392,11 +3991,7 @@ def intersec(f1, f2, f3=None, f4=None, f5=None):
 # Should this be intersect(f0, f1, *args) and take an arbitrary nr of inputs?
     from numpy import minimum
 
-    y = minimum(f1,f2)
-    if f3 != None: y = minimum(y,f3)
-    if f4 != None: y = minimum(y,f4)
-    if f5 != None: y = minimum(y,f5)
-    return y.astype(f1.dtype)
+    return _fold(minimum, (f1, f2, f3, f4, f5), out)
 
 
 def intershow(Iab):
@@ -2468,6 +4063,15 @@ def isbinary(f):
     """
     return f.dtype == bool
 
+def _allbinary(fs):
+    """
+    is_b = _allbinary(fs)
+
+    Whether all the elements of `fs` that are not ``None`` are binary images
+    (and not, e.g., constants).
+    """
+    return all(f is None or getattr(f, 'dtype', None) == bool for f in fs)
+
 def asbinary(f):
     """
     fbin = asbinary(f)
@@ -2527,7 +4131,8 @@ def labelflat(f, Bc=None, lambda_=0):
     zone is detected where two neighboring pixels belong to the same
     region if their difference gray-levels is smaller or equal
     `lambda`. The minimum label of the output image is 1 and the
-    maximum is the number of flat-zones in the image.
+    maximum is the number of flat-zones in the image. Zones are
+    numbered in raster order of their first pixel.
 
     Parameters
     ----------
@@ -2568,24 +4173,19 @@ def labelflat(f, Bc=None, lambda_=0):
             show(f)
             lblshow(g)
     """
-    from numpy import allclose, ravel, nonzero, array
     import numpy as np
     if Bc is None: Bc = secross()
-    assert not lambda_, 'pymorph.labelflat: only lambda_==0 is supported.'
-
-    label = 1
-    labeled = np.zeros(f.shape, np.uint16)
-    fmark = np.zeros_like(f)
-    Y,X = np.where(f)
-    for y,x in zip(Y,X):
-        if labeled[y,x]: continue
-        val = f[y,x]
-        fmark[y,x] = val
-        r = infrec(fmark, (f == val), Bc)
-        labeled[r] = label
-        fmark[y,x] = 0
-        label += 1
-    return labeled
+    f = np.asarray(f)
+    if len(f.shape) == 1: f = f[np.newaxis,:]
+    if not lambda_:
+        linked = lambda src, dst: f[src] == f[dst]
+    else:
+        if f.dtype.kind in 'biu':
+            g = f.astype(np.int64)
+        else:
+            g = f.astype(np.float64)
+        linked = lambda src, dst: np.abs(g[src] - g[dst]) <= lambda_
+    return _label_components(np.ones(f.shape, bool), Bc, linked)
 
 
 def lastero(f, B=None):
@@ -2613,7 +4213,7 @@ def lastero(f, B=None):
 
     assert isbinary(f),'pymorph.lastero: can only process binary images'
     if B is None: B = secross()
-    dt = dist(f,B)
+    dt = dist(f,B,'euclidean2',dtype='uint16')
     return regmax(dt,B)
 
 
@@ -2757,7 +4357,7 @@ def opentransf(f, type='octagon', n=65535, Bc=None, Buser=None):
 
     Returns
     -------
-    y : Gray-scale (uint16) image.
+    y : Gray-scale image: uint8, or uint16 if a value exceeds 255.
     """
     """
         - Examples
@@ -2802,28 +4402,20 @@ def opentransf(f, type='octagon', n=65535, Bc=None, Buser=None):
         rec_flag = True
         type = type[:-len('-rec')]
     disk_se = (type in ('octagon', 'chessboard', 'city-block'))
+    line = None
     if disk_se:
         n  = min(n,min(f.shape))
     elif  type == 'linear-h':
-        se = binary([[1, 1, 1]])
+        line = (0,1)
         n  = min(n,f.shape[1])
     elif  type =='linear-v':
-        se = binary([
-                [1],
-                [1],
-                [1]])
+        line = (1,0)
         n  = min(n,f.shape[0])
     elif  type == 'linear-45r':
-        se = binary([
-                    [0, 0, 1],
-                    [0, 1, 0],
-                    [1, 0, 0]])
+        line = (1,-1)
         n  = min(n,min(f.shape))
     elif  type == 'linear-45l':
-        se = binary([
-                    [1, 0, 0],
-                    [0, 1, 0],
-                    [0, 0, 1]])
+        line = (1,1)
         n  = min(n,min(f.shape))
     elif  type == 'user':
         se = Buser
@@ -2832,22 +4424,244 @@ def opentransf(f, type='octagon', n=65535, Bc=None, Buser=None):
         assert False, \
             'pymorph.opentransf: only accepts octagon, chessboard, \
                 city-block, linear-h, linear-v, linear-45r, linear-45l, or user as type, or with suffix -rec.'
-    y = np.zeros(f.shape, np.uint8)
-    for k in xrange(n):
-        prev = y
-        if disk_se:
-            a = open(f, sedisk(k, 2, type))
-        else:
-            a = open(f, sesum(se,k))
-        y = addm(y, gray(a,'uint16',1))
-        if isequal(y, prev):
-            break
+    n = max(n, 0)
+    if disk_se:
+        # the pixels in open(f, sedisk(k)) are those covered by a disk of
+        # radius k centred in erode(f, sedisk(k))
+        ses, which = _disk_steps(type)
+        y = _unpeel(_peel(f, ses, which, n), ses, which) + 1
+    elif line is not None:
+        y = _runs_opentransf(f, line, n)
+    else:
+        # the openings decrease with k: open(f, kB) is computed only in the
+        # bounding box of the last opening, on a window wide enough that
+        # no translate of kB can reach the box from outside of the window
+        h,w = f.shape
+        y = np.zeros(f.shape, np.uint16)
+        r0,r1,c0,c1 = 0,h,0,w
+        for k in xrange(n):
+            B = sesum(se,k)
+            x = mat2set(B)[0]
+            m = (2*abs(x).max()+1 if len(x) else 0)
+            a0,a1,b0,b1 = max(r0-m,0),min(r1+m,h),max(c0-m,0),min(c1+m,w)
+            a = open(f[a0:a1,b0:b1], B)[r0-a0:r1-a0, c0-b0:c1-b0]
+            rows,cols = np.nonzero(a)
+            if not len(rows):
+                break
+            yw = y[r0:r1,c0:c1]
+            addm(yw, a, yw)
+            r0,r1 = r0+rows.min(), r0+rows.max()+1
+            c0,c1 = c0+cols.min(), c0+cols.max()+1
+        if _iterations_hook is not None: _iterations_hook(k+1 if n > 0 else 0)
+    y = y.astype(np.uint16 if y.size and y.max() > 255 else np.uint8)
 
     if rec_flag:
         return grain(label(f,Bc), y, 'max')
     return y
 
 
+def _runs_opentransf(f, line, n):
+    """
+    y = _runs_opentransf(f, line, n)
+
+    `opentransf` of the 2-D binary image `f` by the segments of direction
+    `line` (``(0,1)``, ``(1,0)``, ``(1,1)`` or ``(1,-1)``), of at most `n`
+    pixels, from the length of the run of each pixel along the lines.
+
+    The segment of ``2k+1`` pixels fits in a run of `L` pixels if
+    ``2k+1 <= L``; if the run touches the border of the image, outside of
+    which the erosion sees foreground, if ``k+1 <= L``; and always if it
+    touches the border at both ends.
+    """
+    import numpy as np
+    dy,dx = line
+    if dx == 0:
+        return _runs_opentransf(np.asarray(f).T, (0,1), n).T.copy()
+    h,w = f.shape
+    r,c = np.indices((h,w)).reshape((2,-1))
+    if dy == 0:
+        order = np.arange(h*w)
+        key = r
+    else:
+        # the diagonals are the columns of the image sheared by dx
+        idx = np.empty((h,w+h-1), np.intp)
+        idx.fill(-1)
+        idx[r, c - dx*r + (h-1 if dx > 0 else 0)] = np.arange(h*w)
+        idx = idx.T.ravel()
+        valid = (idx >= 0)
+        order = idx[valid]
+        key = np.repeat(np.arange(w+h-1), h)[valid]
+    g = np.asarray(f).ravel()[order]
+    y = np.zeros(h*w, np.int32)
+    if not g.any():
+        return y.reshape((h,w))
+    first = np.ones(h*w, bool)
+    first[1:] = (key[1:] != key[:-1])
+    last = np.ones(h*w, bool)
+    last[:-1] = first[1:]
+    start = g.copy()
+    start[1:] &= ~(g[:-1] & ~first[1:])
+    end = g.copy()
+    end[:-1] &= ~(g[1:] & ~last[:-1])
+    s0 = np.flatnonzero(start)
+    s1 = np.flatnonzero(end)
+    L = s1 - s0 + 1
+    open0 = first[s0]
+    open1 = last[s1]
+    v = (L+1)//2
+    v[open0 | open1] = L[open0 | open1]
+    v[open0 & open1] = n
+    np.minimum(v, n, v)
+    run = np.cumsum(start) - 1
+    y[order[g]] = v[run[g]]
+    return y.reshape((h,w))
+
+
+def _disk_steps(type):
+    """
+    ses, which = _disk_steps(type)
+
+    The disk ``sedisk(k, 2, type)`` ('octagon', 'chessboard' or
+    'city-block') is the sum (`sedilate`) of ``ses[which(i)]`` for
+    ``i = 1, ..., k``.
+    """
+    if type == 'city-block':
+        return [secross()], lambda i: 0
+    if type == 'chessboard':
+        return [sebox()], lambda i: 0
+    # octagon: a box, then crosses and boxes in turn, from a second cross
+    return [sebox(), secross()], lambda i: (0 if i == 1 or (i > 2 and i % 2 == 0) else 1)
+
+
+def _peel(f, ses, which, n):
+    """
+    D = _peel(f, ses, which, n)
+
+    For each pixel of the 2-D binary image `f`, the largest ``k < n``
+    such that the pixel is in the erosion of `f` by the disk of radius `k`,
+    the sum of the binary structuring elements ``ses[which(i)]``,
+    ``i = 1, ..., k`` (-1 outside of `f`).
+
+    The erosions are done in turn, and the first one by each structuring
+    element tests the whole image; after that, an erosion only tests the
+    neighbours of the pixels removed since the previous erosion by the same
+    structuring element.
+    """
+    import numpy as np
+    h,w = f.shape
+    X = [np.asarray(mat2set(B)[0], np.intp).reshape((-1,2)) for B in ses]
+    m = max([abs(x).max() for x in X if len(x)] + [0])
+    H,W = h+2*m, w+2*m
+    # outside of the image counts as foreground for the erosion
+    A = np.ones((H,W), bool)
+    A[m:m+h, m:m+w] = f
+    inside = np.zeros((H,W), bool)
+    inside[m:m+h, m:m+w] = True
+    D = np.empty((H,W), np.int32)
+    D.fill(-1)
+    D[m:m+h, m:m+w][f] = n-1
+    A = A.ravel()
+    inside = inside.ravel()
+    Df = D.ravel()
+    off = [x[:,0]*W + x[:,1] for x in X]
+    last = [None]*len(ses)
+    died = []
+    left = int(f.sum())
+    removed = 0
+    for k in xrange(1, n):
+        if not left: break
+        # stable once every structuring element found nothing to remove
+        if all(l is not None and l > removed for l in last): break
+        j = which(k)
+        if last[j] is None:
+            # whole image
+            A2 = A.reshape((H,W))
+            E = A2[m:m+h, m:m+w].copy()
+            for dy,dx in X[j]:
+                E &= A2[m+dy:m+dy+h, m+dx:m+dx+w]
+            gone = np.flatnonzero(A2[m:m+h, m:m+w] & ~E)
+            gone = (gone//w + m)*W + gone%w + m
+        else:
+            cand = [d for d in died[last[j]-1:] if len(d)]
+            if cand:
+                cand = (np.concatenate(cand)[:,np.newaxis] - off[j]).ravel()
+                cand = cand[inside[cand]]
+                cand = np.unique(cand[A[cand]])
+            else:
+                cand = np.zeros(0, np.intp)
+            dead = np.zeros(len(cand), bool)
+            for o in off[j]:
+                dead |= ~A[cand + o]
+            gone = cand[dead]
+        last[j] = k
+        A[gone] = False
+        Df[gone] = k-1
+        died.append(gone)
+        left -= len(gone)
+        if len(gone): removed = k
+    return D[m:m+h, m:m+w].copy()
+
+
+def _unpeel(D, ses, which):
+    """
+    V = _unpeel(D, ses, which)
+
+    For each pixel, the largest ``D[c]`` of the pixels `c` whose disk of
+    radius ``D[c]`` (see `_peel`) contains it (-1 if there is none).
+
+    All the disks grow at once, adding ``ses[which(k)]``, ..., ``ses[which(1)]``
+    to a disk of radius `k`, so that they all end at the same step and the
+    larger ones start first. Each pixel keeps the largest radius that
+    reached it (the disks of larger radii contain the others from there
+    on). A step only propagates the pixels that changed since the previous
+    step by the same structuring element.
+    """
+    import numpy as np
+    h,w = D.shape
+    X = [np.asarray(mat2set(B)[0], np.intp).reshape((-1,2)) for B in ses]
+    m = max([abs(x).max() for x in X if len(x)] + [0])
+    H,W = h+2*m, w+2*m
+    V = np.empty((H,W), np.int32)
+    V.fill(-1)
+    V[m:m+h, m:m+w] = D
+    inside = np.zeros((H,W), bool)
+    inside[m:m+h, m:m+w] = True
+    Vf = V.ravel()
+    inside = inside.ravel()
+    off = [x[:,0]*W + x[:,1] for x in X]
+    K = (D.max() if D.size else 0)
+    # the centres of the disks of each radius
+    centres = np.flatnonzero(Vf > 0)
+    centres = centres[Vf[centres].argsort(kind='mergesort')]
+    bounds = np.searchsorted(Vf[centres], np.arange(K+2))
+    last = [None]*len(ses)
+    changed = [None]
+    for t in xrange(1, K+1):
+        k = K-t+1
+        j = which(k)
+        new = centres[bounds[k]:bounds[k+1]]
+        if last[j] is None:
+            src = np.flatnonzero(Vf >= k)
+        else:
+            src = [c for c in changed[last[j]:] if c is not None and len(c)]
+            src = np.unique(np.concatenate(src + [new]))
+        src = src[Vf[src] >= k]
+        last[j] = t
+        v = Vf[src]
+        new = []
+        for o in off[j]:
+            q = src + o
+            keep = inside[q]
+            q = q[keep]
+            vq = v[keep]
+            grow = (vq > Vf[q])
+            if grow.any():
+                Vf[q[grow]] = vq[grow]
+                new.append(q[grow])
+        changed.append(np.concatenate(new) if new else None)
+    return V[m:m+h, m:m+w].copy()
+
+
 def patspec(f, type='octagon', n=65535, Bc=None, Buser=None):
     """
     h = patspec(f, type='octagon', n=65535, Bc={3x3 cross}, Buser=None)
@@ -3115,13 +4929,13 @@ def sebox(r=1):
 
     Returns
     -------
-    B : Structuring Element
+    B : Structuring Element (read-only)
     """
 
-    return sesum(binary([[1,1,1],
-                         [1,1,1],
-                         [1,1,1]]),
-                 r)
+    return _se_memo(('sebox', r), lambda: sesum(binary([[1,1,1],
+                                                         [1,1,1],
+                                                         [1,1,1]]),
+                                                 r))
 
 
 def secross(r=1):
@@ -3143,12 +4957,12 @@ def secross(r=1):
 
     Returns
     -------
-    B : Structuring Element
+    B : Structuring Element (read-only)
     """
-    return sesum(binary([[0,1,0],
-                         [1,1,1],
-                         [0,1,0]]),
-                 r)
+    return _se_memo(('secross', r), lambda: sesum(binary([[0,1,0],
+                                                           [1,1,1],
+                                                           [0,1,0]]),
+                                                   r))
 
 
 def sedisk(r=3, dim=2, metric="euclidean", flat=True, h=0):
@@ -3176,13 +4990,23 @@ def sedisk(r=3, dim=2, metric="euclidean", flat=True, h=0):
 
     Returns
     -------
-    B : Structuring Element
+    B : Structuring Element (read-only)
     """
     from string import lower
-    from numpy import resize, transpose, arange
-    from numpy import sqrt, arange, transpose, maximum
 
     metric = lower(metric)
+    return _se_memo(('sedisk', r, dim, metric, flat, h), _sedisk, r, dim, metric, flat, h)
+
+
+def _sedisk(r, dim, metric, flat, h):
+    """
+    B = _sedisk(r, dim, metric, flat, h)
+
+    `sedisk`, without the cache (`metric` is in lower case).
+    """
+    from numpy import resize, transpose, arange
+    from numpy import sqrt, arange, transpose, maximum, where
+
     assert dim== 2, 'pymorph.sedisk: Supports only 2D structuring elements'
     if flat: y = binary([[1]])
     else:    y = to_int32([[h]])
@@ -3194,7 +5018,7 @@ def sedisk(r=3, dim=2, metric="euclidean", flat=True, h=0):
             b = to_int32([[-2147483647, 0,-2147483647],
                           [          0, 1,          0],
                           [-2147483647, 0,-2147483647]])
-        return sedilate(y,sesum(b,r))
+        return sedilate(sesum(b,r),y)
     elif metric == 'chessboard':
         if flat:
             b = sebox(1)
@@ -3202,7 +5026,7 @@ def sedisk(r=3, dim=2, metric="euclidean", flat=True, h=0):
             b = to_int32([[1,1,1],
                           [1,1,1],
                           [1,1,1]])
-        return sedilate(y,sesum(b,r))
+        return sedilate(sesum(b,r),y)
     elif metric == 'octagon':
         if flat:
             b1,b2 = sebox(1),secross(1)
@@ -3217,7 +5041,17 @@ def sedisk(r=3, dim=2, metric="euclidean", flat=True, h=0):
                     [-2147483647, 0, -2147483647]])
         if r == 1:
             return b1
-        return sedilate(sedilate(y,sesum(b1,r//2)), sesum(b2,(r+1)//2))
+        # sesum(b1,r//2) + sesum(b2,(r+1)//2), built at once: the a = r//2
+        # boxes move up to 1 in each direction, the b = (r+1)//2 crosses move
+        # by 1 in one direction, or not at all
+        a, b = r//2, (r+1)//2
+        v = abs(arange(-r,r+1))
+        # crosses that must move to reach each pixel
+        m = maximum(maximum(maximum(v[:,None], v[None,:]) - a, v[:,None] + v[None,:] - 2*a), 0)
+        if flat:
+            return binary(m <= b)
+        # each box adds 1, and each cross that does not move
+        return to_int32(where(m <= b, h + a + b - m, -2147483647))
     elif metric == 'euclidean':
         v = arange(-r,r+1)
         x = resize(v, (len(v), len(v)))
@@ -3254,7 +5088,7 @@ def seline(length=3, theta=0):
 
     Returns
     -------
-    B : Structuring Element
+    B : Structuring Element (read-only)
 
     Examples
     --------
@@ -3279,6 +5113,15 @@ def seline(length=3, theta=0):
                [0, 1, 1],
                [0, 0, 1]], dtype=uint8)
 
+    """
+    return _se_memo(('seline', length, theta), _seline, length, theta)
+
+
+def _seline(length, theta):
+    """
+    B = _seline(length, theta)
+
+    `seline`, without the cache.
     """
     import numpy
     from numpy import pi, tan, cos, sin, sign, floor, arange, transpose, array, ones
@@ -3313,13 +5156,23 @@ def serot(b, theta=45, direction="clockwise"):
 
     Returns
     -------
-    brot : structuring element
+    brot : structuring element (read-only)
     """
     from string import lower
+
+    direction = lower(direction)
+    return _se_memo(('serot', _se_key(b), theta, direction), _serot, b, theta, direction)
+
+
+def _serot(b, theta, direction):
+    """
+    brot = _serot(b, theta, direction)
+
+    `serot`, without the cache (`direction` is in lower case).
+    """
     from numpy import array, transpose, concatenate
     from numpy import cos, sin, pi
 
-    direction = lower(direction)
     if direction == "anti-clockwise":
        theta = -theta
     theta = pi * theta/180.
@@ -3399,19 +5252,82 @@ def sesum(B=None, N=1):
 
     Returns
     -------
-    Bn : Structuring Element
+    Bn : Structuring Element (read-only)
     """
 
     if B is None: B = secross()
     if N==0:
         if isbinary(B): return binary([[1]])
         else:           return to_int32([[0]]) # identity
-    NB = B
-    for i in xrange(N-1):
-        NB = sedilate(NB,B)
+    # start from the largest sum already computed (so that the sums of
+    # growing sizes in asf() cost one addition each)
+    k = _se_key(B)
+    n = N
+    NB = None
+    while n > 1:
+        NB = _se_cached(('sesum', k, n))
+        if NB is not None: break
+        n -= 1
+    if NB is None:
+        NB = _se_memo(('sesum', k, 1), lambda: B)
+    for i in xrange(n+1, N+1):
+        NB = _se_memo(('sesum', k, i), sedilate, NB, B)
     return NB
 
 
+_se_cache = OrderedDict()
+_se_cache_size = 512
+# the cache is shared by the threads (of tiled(), for instance)
+_se_lock = threading.Lock()
+
+def _se_cached(key):
+    """
+    B = _se_cached(key)
+
+    The structuring element of `key` in the cache (marked as the most
+    recently used), or None.
+    """
+    with _se_lock:
+        B = _se_cache.pop(key, None)
+        if B is not None:
+            _se_cache[key] = B
+        return B
+
+
+def _se_memo(key, build, *args):
+    """
+    B = _se_memo(key, build, *args)
+
+    ``build(*args)``, which is only called if `key` is not among the keys
+    of the `_se_cache_size` structuring elements most recently used. As the
+    structuring elements are shared, they are made read-only.
+    """
+    B = _se_cached(key)
+    if B is not None:
+        return B
+    # built without the lock, as building may use the cache
+    B = build(*args).copy()
+    B.setflags(write=False)
+    with _se_lock:
+        # another thread may have built it meanwhile
+        B = _se_cache.pop(key, B)
+        if len(_se_cache) >= _se_cache_size:
+            _se_cache.popitem(last=False)
+        _se_cache[key] = B
+    return B
+
+
+def _se_key(B):
+    """
+    k = _se_key(B)
+
+    Hashable key for the contents of the structuring element `B`.
+    """
+    from numpy import asarray
+    B = asarray(B)
+    return (B.shape, B.dtype.str, B.tostring())
+
+
 def setrans(Bi, t):
     """
     Bo = setrans(Bi, t)
@@ -3481,6 +5397,11 @@ def sedilate(B1, B2):
     assert (isbinary(B1) or (B1.dtype == int32)) and (isbinary(B2) or B2.dtype == int32), 'pymorph.sedilate: s.e. must be binary or int32'
     if len(B1.shape) == 1: B1 = B1[newaxis,:]
     if len(B2.shape) == 1: B2 = B2[newaxis,:]
+    if isbinary(B1) and isbinary(B2):
+        x1,x2 = mat2set(B1)[0], mat2set(B2)[0]
+        if len(x1) and len(x2):
+            # all the sums of a point of B1 and a point of B2 at once
+            return binary(set2mat(((x1[:,newaxis] + x2).reshape((-1,2)),)))
     if B1.dtype==int32 or B2.dtype == int32:
        Bo = to_int32([limits(to_int32([0]))[0]])
        if isbinary(B1):
@@ -3594,24 +5515,77 @@ def skelm(f, B=None, return_binary=True):
             c=skelm(a,secross(),'value')
             show(c)
     """
-    from numpy import asarray
+    from numpy import zeros, uint16, invert, asarray
     if B is None: B = secross()
     assert isbinary(f),'pymorph.skelm: only works for binary images'
-    k1,k2 = limits(f)
-    y = gray(intersec(f, k1),'uint16')
-    iszero = asarray(y)
+    B = asbinary(B)
+    if f.ndim == 2 and (0,0) in map(tuple, mat2set(B)[0]):
+        # the pixels of erode(f, rB) which are not in open(erode(f, rB), B) are
+        # those of depth r which are maxima of the depth in the neighbourhood B
+        # (the pixels of infinite depth, never eroded, are not in it)
+        D = _peel(f, [B], lambda i: 0, 65535)
+        y = asarray(D + 1, uint16)
+        y[(dilate(D, B) != D) | (D == 65534)] = 0
+        if return_binary:
+            return binary(y)
+        return y
+    w = f.shape[-1]
+    P = _pack(f)
+    y = zeros((P.shape[0],w), uint16)
+    xe = _erosion_offsets(B)
+    xd = mat2set(asbinary(B))[0]
     nb = sesum(B,0)
     for r in xrange(1,65535):
-        ero = erode(f,nb)
-        if isequal(ero, iszero): break
-        f1 = openth(ero, B)
+        ero = _packed_erode(P, w, _erosion_offsets(nb))
+        if not ero.any(): break
+        # opening top-hat of ero by B
+        f1 = _packed_dilate(_packed_erode(ero, w, xe), w, xd)
+        f1 = invert(f1, f1)
+        f1 &= ero
         nb = sedilate(nb, B)
-        y = union(y, gray(f1,'uint16',r))
+        y[_unpack(f1, w)] = r
     if return_binary:
         return binary(y)
     return y
 
 
+def _reverse_dist(R, chessboard):
+    """
+    R = _reverse_dist(R, chessboard)
+
+    Reverse distance transform, in place: ``R[p]`` becomes the largest
+    ``R[c] - d(c,p)`` for the city-block (or, if `chessboard`, chessboard)
+    distance `d`. ``R[p] >= 0`` is then the union of the disks of radius
+    ``R[c]`` by the 3x3 cross (or box) centred at the pixels `c`.
+    """
+    import numpy as np
+    if not R.size:
+        return R
+    if chessboard:
+        # down then up the rows, each row from the 3 pixels above (below) it
+        for rows in (R, R[::-1], R.T, R.T[::-1]):
+            for y in xrange(1, len(rows)):
+                prev = rows[y-1] - 1
+                above = prev.copy()
+                np.maximum(above[1:], prev[:-1], above[1:])
+                np.maximum(above[:-1], prev[1:], above[:-1])
+                np.maximum(rows[y], above, rows[y])
+        return R
+    # the city-block cone is separable, and its 1-D profile, ``a[x'] - |x-x'|``,
+    # is a running maximum of ``a[x'] + x'`` (or ``a[x'] - x'`` from the right),
+    # taken along the rows (much faster than along the columns)
+    for A in (R.T.copy(), R):
+        x = np.arange(A.shape[1])
+        left = np.maximum.accumulate(A + x, 1)
+        left -= x
+        right = np.maximum.accumulate((A - x)[:,::-1], 1)[:,::-1]
+        right += x
+        np.maximum(left, right, A)
+        if A is not R:
+            R[...] = A.T
+    return R
+
+
 def skelmrec(f, B=None):
     """
     y = skelmrec(f, B={3x3 cross})
@@ -3642,7 +5616,17 @@ def skelmrec(f, B=None):
             c=skelmrec(b,secross())
             print c
     """
+    from numpy import asarray, int32
     if B is None: B = secross()
+    B = asbinary(B)
+    X = set(map(tuple, mat2set(B)[0]))
+    cross = set([(0,0),(-1,0),(1,0),(0,-1),(0,1)])
+    box = set([(dy,dx) for dy in (-1,0,1) for dx in (-1,0,1)])
+    # the loop costs a packed dilation per radius, cheaper below about 40 radii
+    if f.ndim == 2 and X in (cross, box) and f.max() > 40:
+        # the pixel of value r is the centre of a disk of radius r-1
+        R = asarray(f, int32) - 1
+        return binary(_reverse_dist(R, X == box) >= 0)
     y = binary(intersec(f, 0))
     for r in xrange(f.max(),1,-1):
         y = dilate(union(y,binary(f,r)), B)
@@ -3704,12 +5688,15 @@ def skiz(f, Bc=None, return_lines=False, metric=None):
     """
     from string import upper
     if Bc is None: Bc = secross()
+    if metric is not None and upper(metric) == 'EUCLIDEAN':
+        # same flooding order as the distance itself, without rounding
+        metric = 'euclidean2'
     d = dist(neg(f), Bc, metric)
     return cwatershed(d,f,Bc,return_lines)
 
-def subm(f1, f2):
+def subm(f1, f2, out=None):
     """
-    y = subm(f1, f2)
+    y = subm(f1, f2, out=None)
 
     Subtraction of two images, with saturation.
 
@@ -3723,6 +5710,8 @@ def subm(f1, f2):
     ----------
     f1 : Unsigned gray-scale (uint8 or uint16), signed (int32) or binary image.
     f2 : Unsigned gray-scale (uint8 or uint16), signed (int32) or binary image. Or constant.
+    out : ndarray of the type of `f1`, optional
+        Output array (may be `f1` itself).
 
     Returns
     -------
@@ -3748,14 +5737,75 @@ def subm(f1, f2):
         show(b)
         show(c)
     """
-    from numpy import array, clip
+    return _saturated(f1, f2, True, out)
+
+
+def _saturated(f1, f2, subtract, out=None):
+    """
+    y = _saturated(f1, f2, subtract, out=None)
 
-    if type(f2) is array:
-        if f1.dtype != f2.dtype:
-            raise TypeError('pymorph.subm(): arguments cannot have different datatypes')
-    bottom,top = limits(f1)
-    y = clip(f1.astype('d') - f2, bottom, top)
-    return y.astype(f1.dtype)
+    ``f1 + f2`` (``f1 - f2`` if `subtract`), saturated to `limits(f1)`,
+    in the type of `f1`.
+
+    Integer constants and images of the same type are combined in the
+    unsigned type of `f1` itself, by clamping before the operation (for
+    example, ``min(f1, top-c) + c``), and binary images with bitwise
+    operators. Anything else is computed in a wider type: int32 when both
+    operands fit in 16 bits (or `f2` is a small constant), int64 for other
+    integers and float64 only when an operand is floating point.
+    """
+    import numpy as np
+    dtype = f1.dtype
+    bottom,top = [int(v) for v in limits(f1)]
+    f2dtype = np.asarray(f2).dtype
+    if np.ndim(f2) == 0 and dtype.kind == 'u' and f2dtype.kind in 'biu':
+        c = max(min(int(f2), top), -top)
+        if subtract: c = -c
+        if out is None: out = np.empty(f1.shape, dtype)
+        if c >= 0:
+            np.minimum(f1, top - c, out)
+            np.add(out, c, out)
+        else:
+            np.maximum(f1, -c, out)
+            np.subtract(out, -c, out)
+        return out
+    if isinstance(f2, np.ndarray) and dtype.kind in 'bu' and \
+            (f2dtype == dtype or (f2dtype == bool and dtype.kind == 'u')):
+        f2 = f2.astype(dtype, copy=False)
+        if out is None:
+            out = np.empty(np.broadcast(f1, f2).shape, dtype)
+        elif np.may_share_memory(out, f2):
+            f2 = f2.copy()
+        if dtype == bool:
+            if subtract: np.greater(f1, f2, out)
+            else: np.logical_or(f1, f2, out)
+        elif subtract:
+            np.maximum(f1, f2, out)
+            np.subtract(out, f2, out)
+        else:
+            if np.may_share_memory(out, f1):
+                np.minimum(f1, top - f2, out)
+            else:
+                np.subtract(top, f2, out)
+                np.minimum(out, f1, out)
+            np.add(out, f2, out)
+        return out
+    if np.result_type(f1, f2).kind == 'f':
+        wide = np.float64
+    elif dtype.itemsize < 4 and f2dtype.kind in 'biu' and \
+            (f2dtype.itemsize <= 2 if np.ndim(f2) else -2**30 < int(f2) < 2**30):
+        # no overflow: both operands fit in 16 bits, or f2 in 30 bits
+        wide = np.int32
+    else:
+        wide = np.int64
+    y = f1.astype(wide)
+    if subtract: np.subtract(y, f2, y, casting='unsafe')
+    else: np.add(y, f2, y, casting='unsafe')
+    np.clip(y, bottom, top, y)
+    if out is None:
+        return y.astype(dtype)
+    out[...] = y
+    return out
 
 
 def supcanon(f, Iab, theta=45, direction="clockwise"):
@@ -3783,6 +5833,9 @@ def supcanon(f, Iab, theta=45, direction="clockwise"):
     ------
     y : Binary image.
     """
+    if isbinary(f):
+        w = f.shape[-1]
+        return _unpack(_packed_hmt(_pack(f), w, _packed_intervals(Iab, theta, direction)), w)
     y = intersec(f,0)
     for t in xrange(0,360,theta):
         Irot = interot(Iab, t, direction)
@@ -3836,6 +5889,9 @@ def supgen(f, interval):
     """
 
     A,Bc = interval
+    if isbinary(f):
+        w = f.shape[-1]
+        return _unpack(_packed_supgen(_pack(f), w, _erosion_offsets(A), _erosion_offsets(Bc)), w)
     return intersec(erode(f,A),
                    erode(neg(f),Bc))
 
@@ -3861,10 +5917,10 @@ def suprec(f, g, Bc=None):
     -------
     y : Image
     """
-    from numpy import product
     if Bc is None: Bc = secross()
-    n = product(f.shape)
-    return cerode(f,g,Bc,n);
+    # g is negated in the type of f
+    g = _clip_to(g, f)
+    return neg(_reconstruct(neg(f), neg(g), sereflect(Bc)))
 
 
 def bshow(f1, f2=None, f3=None, factor=17):
@@ -4002,16 +6058,10 @@ def thick(f, Iab=None, n=-1, theta=45, direction="clockwise"):
     if Iab is None: Iab = homothick()
     assert isbinary(f),'f must be binary image'
     if n == -1: n = product(f.shape)
-    y = f
-    zero = intersec(f,0)
-    for i in xrange(n):
-        aux = zero
-        for t in xrange(0,360,theta):
-            sup = supgen(y, interot(Iab, t, direction))
-            aux = union(aux, sup)
-            y = union(y, sup)
-        if isequal(aux,zero): break
-    return y
+    w = f.shape[-1]
+    y = _pack(f)
+    rots = _packed_intervals(Iab, theta, direction)
+    return _unpack(_packed_iterate(y, w, rots, n, False), w)
 
 
 def thin(f, Iab=None, n=-1, theta=45, direction="clockwise"):
@@ -4055,21 +6105,15 @@ def thin(f, Iab=None, n=-1, theta=45, direction="clockwise"):
     direction = lower(direction)
     assert isbinary(f),'f must be binary image'
     if n == -1: n = product(f.shape)
-    y = f
-    zero = intersec(f,0)
-    for i in xrange(n):
-        aux = zero
-        for t in xrange(0,360,theta):
-            sup = supgen(y, interot(Iab, t, direction))
-            aux = union(aux, sup)
-            y = subm(y, sup)
-        if isequal(aux,zero): break
-    return y
+    w = f.shape[-1]
+    y = _pack(f)
+    rots = _packed_intervals(Iab, theta, direction)
+    return _unpack(_packed_iterate(y, w, rots, n, True), w)
 
 
-def union(f1, f2, *args):
+def union(f1, f2, *args, **kwargs):
     """
-    y = union(f1, f2, f3=None, f4=None, f5=None, ...)
+    y = union(f1, f2, f3=None, f4=None, f5=None, ..., out=None)
 
     Union of images.
 
@@ -4082,6 +6126,10 @@ def union(f1, f2, *args):
     f1 : Gray-scale (uint8 or uint16) or binary image.
     f2 : Gray-scale (uint8 or uint16) or binary image. Or constant
     args : Gray-scale (uint8 or uint16) or binary images.
+    out : ndarray, optional
+        Output array (may be one of the inputs). Its type is the type of
+        the result (the type of `f1`, or binary if all the inputs are
+        binary).
 
     Returns
     -------
@@ -4130,10 +6178,40 @@ def union(f1, f2, *args):
     """
     from numpy import maximum
 
-    y = maximum(f1,f2)
-    for f in args:
-        y = maximum(y,f)
-    return y.astype(f1.dtype)
+    out = kwargs.pop('out', None)
+    if kwargs:
+        raise TypeError, 'pymorph.union: unexpected keyword argument %s' % kwargs.keys()[0]
+    return _fold(maximum, (f1, f2) + args, out)
+
+
+def _fold(op, fs, out=None):
+    """
+    y = _fold(op, fs, out=None)
+
+    ``op(...op(op(fs[0], fs[1]), fs[2])..., fs[-1])`` for a commutative
+    `op` (``maximum`` or ``minimum``), ignoring the ``None`` elements of
+    `fs`. The result has the type of ``fs[0]`` (binary if all the inputs
+    are binary) and is computed in `out`, which may be one of the inputs.
+    """
+    import numpy as np
+
+    fs = [f for f in fs if f is not None]
+    if out is None:
+        dtype = (bool if _allbinary(fs) else fs[0].dtype)
+        out = np.empty(np.broadcast(*fs).shape, dtype)
+    else:
+        # an input that is also the output must be read before out is written
+        for i in xrange(2, len(fs)):
+            if fs[i] is out:
+                fs.insert(0, fs.pop(i))
+                break
+    if len(fs) == 1:
+        out[...] = fs[0]
+        return out
+    op(fs[0], fs[1], out, casting='unsafe')
+    for f in fs[2:]:
+        op(out, f, out, casting='unsafe')
+    return out
 
 
 def watershed(f, Bc=None, return_lines=False):
@@ -4334,9 +6412,9 @@ def datatype(f):
     return type
 
 
-def add4dilate(f, c):
+def add4dilate(f, c, out=None):
     """
-    a = add4dilate(f, c)
+    a = add4dilate(f, c, out=None)
 
     Addition for dilation. Assumes that the minimum value of dtype(f) is
     to represent -inf (where -inf + c == -inf, for all c)
@@ -4345,20 +6423,24 @@ def add4dilate(f, c):
     ----------
     f : Gray-scale or binary image.
     c : Gray-scale, binary image, or constant.
+    out : ndarray of the type of `f`, optional
+        Output array (may be `f` itself).
 
     Returns
     -------
     a : f + c (but with correct implementation of -inf)
     """
-    from numpy import asarray, minimum, maximum, float64
+    from numpy import ndim
 
-    if not c:
-        return f
-    y = asarray(f,float64) + c
-    k1,k2 = limits(f)
-    y = ((f==k1) * k1) + ((f!=k1) * y)
-    y = maximum(minimum(y,k2),k1)
-    return y.astype(f.dtype)
+    if ndim(c) == 0 and not c:
+        if out is None: return f
+        out[...] = f
+        return out
+    k1 = limits(f)[0]
+    inf = (f == k1)
+    y = _saturated(f, c, False, out)
+    y[inf] = k1
+    return y
 
 
 def mat2set(A):
@@ -4475,14 +6557,16 @@ def pad4n(f, Bc, value, scale=1):
     -------
     y : The converted image
     """
-    from numpy import ones, array
+    from numpy import empty, array
 
     if type(Bc) is not array:
       Bc = seshow(Bc)
     Bh, Bw = Bc.shape
     assert Bh%2 and Bw%2, 'structuring element must be odd sized'
-    ch, cw = scale * Bh/2, scale * Bw/2
-    g = value * ones( f.shape + scale * (array(Bc.shape) - 1))
-    g[ ch: -ch, cw: -cw] = f
-    return g.astype(f.dtype)
+    ch, cw = scale * (Bh//2), scale * (Bw//2)
+    h, w = f.shape
+    g = empty((h + 2*ch, w + 2*cw), f.dtype)
+    g.fill(value)
+    g[ ch: ch+h, cw: cw+w] = f
+    return g
 
@@ -0,0 +1,337 @@
+"""
+Profiling of the pymorph operators
+
+Profiling is off by default and then costs nothing: `enable` replaces the
+public functions of pymorph (in `pymorph`, `pymorph.mmorph` and
+`pymorph.compat`) by wrappers which time them, and `disable` puts the
+original functions back. As the operators call each other through these
+modules, the calls made inside an operator are profiled as well::
+
+    import pymorph
+    from pymorph import profiling
+
+    with profiling.profile() as p:
+        pymorph.infrec(marker, f)
+    p.report()
+
+For each function, the profiler records the number of calls, the total
+time (with and without the time spent in the other profiled functions),
+the pixels of its input image, the passes made by the iterative operators
+(`cdilate`, `cerode`, `infrec`, `suprec`, `cdist`, `gdist`, `thin`,
+`thick`, `cthin`, `cthick`, `opentransf`, ...) and, with ``memory=True``,
+the peak of temporary memory of a call.
+
+Each profiled call costs a few microseconds, which is only noticeable for
+operators called many times on small images (3000 dilations of a 16x16
+image take about 1.7 times longer). Measuring the memory costs much more,
+as the memory of the process is read (and its peak reset) at every call:
+the same dilations take more than 10 times longer, and the times of the
+calls are then mostly the cost of profiling. So it is off by default.
+
+The memory is the growth of the resident memory of the process during the
+call, so it is only an estimate (and, with threads, includes the memory of
+the other threads). On Linux, the peak of the resident memory is reset at
+each call; elsewhere only the growth of the peak of the whole process is
+seen, which is 0 for the calls that stay below an earlier peak.
+
+Functions imported before `enable` (``from pymorph import dilate``) are not
+profiled, and neither are the calls made by worker processes.
+
+- `profile()`  : Context manager that profiles its block.
+- `enable()`   : Start profiling.
+- `disable()`  : Stop profiling.
+- `active()`   : The current profiler, if any.
+- `Profiler`   : Statistics and report.
+"""
+import sys
+import threading
+from types import FunctionType
+from functools import wraps
+from contextlib import contextmanager
+from timeit import default_timer
+
+import numpy as np
+import mmorph
+
+_active = None
+_originals = {}
+_lock = threading.Lock()
+
+def _status():
+    """
+    rss, peak = _status()
+
+    Resident memory of the process and its peak, in bytes (None if not
+    available).
+    """
+    rss = peak = None
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    rss = 1024*int(line.split()[1])
+                elif line.startswith('VmHWM:'):
+                    peak = 1024*int(line.split()[1])
+    except (IOError, ValueError, IndexError):
+        pass
+    return rss, peak
+
+
+def _reset_peak():
+    """
+    ok = _reset_peak()
+
+    Reset the peak of the resident memory of the process to its current
+    value (Linux only); return whether it was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def _maxrss():
+    """
+    peak = _maxrss()
+
+    Peak of the resident memory of the process, in bytes (0 if not
+    available).
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (peak if sys.platform == 'darwin' else 1024*peak)
+
+
+class Profiler(object):
+    """
+    Statistics of the calls of the pymorph functions.
+
+    `stats()` returns them and `report()` prints them; `reset()` forgets
+    them.
+    """
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._resettable = False
+        if memory:
+            self._resettable = (None not in _status()) and _reset_peak()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        """
+        p.reset()
+
+        Forget the calls profiled so far.
+        """
+        # name -> [calls, time, self time, pixels, passes, peak bytes]
+        self._records = {}
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _peak(self):
+        if self._resettable:
+            return _status()[1]
+        return _maxrss()
+
+    def _iterations(self, n):
+        stack = self._stack()
+        if stack:
+            stack[-1][2] += n
+
+    def call(self, name, function, args, kwargs):
+        """
+        y = p.call(name, function, args, kwargs)
+
+        ``function(*args, **kwargs)``, profiled under `name`.
+        """
+        stack = self._stack()
+        base = 0
+        if self.memory:
+            peak = self._peak()
+            if stack:
+                stack[-1][3] = max(stack[-1][3], peak)
+            if self._resettable:
+                _reset_peak()
+                base = _status()[0]
+            else:
+                base = peak
+        pixels = 0
+        for a in args[:2]:
+            if isinstance(a, np.ndarray):
+                pixels = a.size
+                break
+        # name, time of the profiled callees, passes, peak memory
+        frame = [name, 0., 0, base]
+        stack.append(frame)
+        start = default_timer()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            t = default_timer() - start
+            stack.pop()
+            temporary = 0
+            if self.memory:
+                peak = max(frame[3], self._peak())
+                temporary = max(peak - base, 0)
+                if stack:
+                    stack[-1][3] = max(stack[-1][3], peak)
+            if stack:
+                stack[-1][1] += t
+            with _lock:
+                r = self._records.get(name)
+                if r is None:
+                    r = self._records[name] = [0, 0., 0., 0, 0, 0]
+                r[0] += 1
+                r[1] += t
+                r[2] += t - frame[1]
+                r[3] += pixels
+                r[4] += frame[2]
+                r[5] = max(r[5], temporary)
+
+    def stats(self):
+        """
+        S = p.stats()
+
+        Dictionary of the statistics of each function called, by name:
+
+        - 'calls':        number of calls.
+        - 'time':         total time of the calls, in seconds.
+        - 'self':         time not spent in other profiled functions.
+        - 'pixels':       total pixels of the input images.
+        - 'pixels_per_s': throughput, ``pixels/time``.
+        - 'iterations':   total passes of the iterative operators.
+        - 'peak_bytes':   largest temporary memory of a call (0 if the
+                          memory is not profiled).
+        """
+        S = {}
+        with _lock:
+            for name, (calls, t, tself, pixels, passes, peak) in self._records.items():
+                S[name] = {
+                    'calls': calls,
+                    'time': t,
+                    'self': tself,
+                    'pixels': pixels,
+                    'pixels_per_s': (pixels/t if t > 0 else 0.),
+                    'iterations': passes,
+                    'peak_bytes': peak,
+                }
+        return S
+
+    def report(self, out=None, sort='time', limit=None):
+        """
+        p.report(out=sys.stdout, sort='time', limit=None)
+
+        Print a table of `stats()` to `out`, sorted by decreasing `sort`
+        (one of its keys), the first `limit` functions only (default: all).
+        """
+        if out is None: out = sys.stdout
+        S = self.stats()
+        names = sorted(S, key=lambda name: (-S[name][sort], name))
+        if limit is not None:
+            names = names[:limit]
+        print >>out, '%-14s %7s %10s %10s %12s %11s %10s' % \
+            ('function', 'calls', 'time (s)', 'self (s)', 'Mpixels/s', 'iterations', 'peak (MB)')
+        for name in names:
+            s = S[name]
+            print >>out, '%-14s %7d %10.4f %10.4f %12.2f %11d %10.2f' % \
+                (name, s['calls'], s['time'], s['self'], s['pixels_per_s']/1e6, s['iterations'], s['peak_bytes']/2.**20)
+
+
+def _wrap(name, function):
+    """
+    w = _wrap(name, function)
+
+    Function that calls `function` through the active profiler.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        p = _active
+        if p is None:
+            return function(*args, **kwargs)
+        return p.call(name, function, args, kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _modules():
+    modules = [mmorph, sys.modules.get('pymorph'), sys.modules.get('pymorph.compat')]
+    return [m for m in modules if m is not None]
+
+
+def active():
+    """
+    p = active()
+
+    The current `Profiler`, or None if profiling is off.
+    """
+    return _active
+
+
+def enable(memory=False):
+    """
+    p = enable(memory=False)
+
+    Start profiling the pymorph functions with a new `Profiler` (the
+    temporary memory is not measured unless `memory`, which slows down the
+    calls much more).
+    """
+    global _active
+    if _active is not None:
+        raise ValueError, 'pymorph.profiling: profiling is already enabled'
+    wrappers = {}
+    for name in mmorph.__all__:
+        function = getattr(mmorph, name)
+        if isinstance(function, FunctionType):
+            wrappers[id(function)] = (function, _wrap(name, function))
+    for module in _modules():
+        for attr, value in vars(module).items():
+            if id(value) in wrappers and wrappers[id(value)][0] is value:
+                _originals[module, attr] = value
+                setattr(module, attr, wrappers[id(value)][1])
+    _active = Profiler(memory)
+    mmorph._iterations_hook = _active._iterations
+    return _active
+
+
+def disable():
+    """
+    p = disable()
+
+    Stop profiling, and return the profiler (None if profiling was off).
+    """
+    global _active
+    p = _active
+    mmorph._iterations_hook = None
+    for (module, attr), function in _originals.items():
+        setattr(module, attr, function)
+    _originals.clear()
+    _active = None
+    return p
+
+
+@contextmanager
+def profile(memory=False):
+    """
+    with profile(memory=False) as p:
+        ...
+
+    Profile the pymorph functions called in the block (see `enable`); if
+    profiling is already on, the block is profiled by the current profiler.
+    """
+    if _active is not None:
+        yield _active
+        return
+    p = enable(memory)
+    try:
+        yield p
+    finally:
+        disable()
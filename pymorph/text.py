@@ -1536,7 +1536,6 @@ def text(txt):
     for i,ch in enumerate(txt):
       ind = ord(ch) - FIRST_CHAR
       assert ind < N_CHARS,'pymorph.text: code not allowed (%s)' % ch
-      print ch, ind
       glyph = FontDft[ind]
       if i == 0:
         y = glyph
@@ -34,7 +34,7 @@ setup(name='pymorph',
       author_email='lpc@cmu.edu',
       url='http://luispedro.org/software/pymorph/',
       license='BSD',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks']),
       )
 
 
@@ -8,3 +8,35 @@ def test_addm():
         assert yi >= fi
         assert yi >= gi
 
+
+def test_addm_saturation():
+    import numpy as np
+    f = to_uint8([0, 1, 100, 254, 255])
+    assert np.all(addm(f, 200) == [200, 201, 255, 255, 255])
+    assert np.all(addm(f, -100) == [0, 0, 0, 154, 155])
+    assert np.all(addm(f, f) == [0, 2, 200, 255, 255])
+    g = f.astype(np.uint16)
+    assert np.all(addm(g, 65500) == [65500, 65501, 65535, 65535, 65535])
+    i = f.astype(np.int32)
+    assert np.all(addm(i, 2147483600) == [2147483600, 2147483601, 2147483647, 2147483647, 2147483647])
+
+def test_addm_out():
+    import numpy as np
+    f = to_uint8([0, 100, 200])
+    y = np.empty_like(f)
+    assert addm(f, f, y) is y
+    assert np.all(y == [0, 200, 255])
+    addm(f, 60, f)
+    assert np.all(f == [60, 160, 255])
+
+def test_addm_int32_extremes():
+    import numpy as np
+    import pymorph
+    f = np.array([0, 1, 65535], np.uint16)
+    assert np.all(addm(f, np.array([2**31-1]*3, np.int32)) == 65535)
+    assert np.all(addm(f, np.array([-2**31]*3, np.int32)) == 0)
+    assert np.all(pymorph.subm(f, np.array([-2**31]*3, np.int32)) == 65535)
+    assert np.all(pymorph.subm(f, np.array([2**31-1]*3, np.int32)) == 0)
+    b = to_uint8([0, 7, 255])
+    assert np.all(pymorph.subm(b, -2**31) == 255)
+    assert np.all(addm(b, np.array([2**31-1, -2**31, 3], np.int32)) == [255, 0, 255])
@@ -0,0 +1,33 @@
+import pymorph
+import numpy as np
+
+def _areaopen_decomposition(f, a, Bc):
+    # reference: binary area openings of the threshold sets
+    y = np.zeros_like(f)
+    for k in xrange(f.min(), f.max()+1):
+        fo = pymorph.areaopen(f >= k, a, Bc)
+        y[fo] = k
+    return y
+
+def test_areaopen_gray():
+    np.random.seed(49)
+    for i in xrange(30):
+        f = np.random.randint(0, 6, (9,11)).astype(np.uint8)
+        a = np.random.randint(1, 12)
+        for Bc in (pymorph.secross(), pymorph.sebox()):
+            assert np.all(pymorph.areaopen(f, a, Bc) == _areaopen_decomposition(f, a, Bc))
+
+def test_areaclose_gray():
+    np.random.seed(50)
+    f = np.random.randint(0, 100, (20,20)).astype(np.uint16)
+    y = pymorph.areaclose(f, 5)
+    assert y.dtype == np.uint16
+    assert np.all(y >= f)
+    assert np.all(pymorph.neg(y) == _areaopen_decomposition(pymorph.neg(f), 5, pymorph.secross()))
+
+def test_areaopen_binary():
+    f = np.zeros((6,6), bool)
+    f[0,0] = f[3:5,3:5] = 1
+    expected = f.copy()
+    expected[0,0] = 0
+    assert np.all(pymorph.areaopen(f, 2) == expected)
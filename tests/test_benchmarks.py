@@ -0,0 +1,40 @@
+import numpy as np
+import benchmarks
+
+def test_images():
+    I = benchmarks.images(64)
+    J = benchmarks.images(64)
+    for name in ('binary', 'text', 'gray', 'noise', 'gradient'):
+        assert I[name].shape == (64,64)
+        assert np.all(I[name] == J[name])
+    assert I['binary'].dtype == bool and I['text'].any()
+    assert I['gray'].dtype == np.uint8
+    assert I['patches'].shape == (4,32,32)
+
+def test_run(tmpdir):
+    results = benchmarks.run(sizes=[64], repeat=1, warmup=0)
+    names = set(name for name,_ in benchmarks.tasks())
+    assert set(r['name'] for r in results['results'].values()) == names
+    for key, r in results['results'].items():
+        assert 'error' not in r, (key, r['error'])
+    filename = str(tmpdir.join('r.json'))
+    benchmarks.save(results, filename)
+    loaded = benchmarks.load(filename)
+    assert loaded['results']['dilate/gray@64']['times'] == results['results']['dilate/gray@64']['times']
+
+def test_compare():
+    def results(**times):
+        return {'meta': {}, 'results': dict((k, ({'min': t} if t is not None else {'error': 'E'})) for k,t in times.items())}
+    old = results(a=1., b=1., c=1., d=1e-5, e=None, f=1.)
+    new = results(a=1.05, b=2., c=.5, d=1e-4, e=1., g=1.)
+    rows = dict((row[0], row) for row in benchmarks.compare(old, new))
+    assert rows['a'][-1] == 'ok'
+    assert rows['b'][-1] == 'regression'
+    assert rows['b'][3] == 2.
+    assert rows['c'][-1] == 'improvement'
+    assert rows['d'][-1] == 'ok'
+    assert rows['e'][-1] == 'fixed'
+    assert rows['f'][-1] == 'missing'
+    assert rows['g'][-1] == 'new'
+    from StringIO import StringIO
+    assert benchmarks.report(benchmarks.compare(old, new), StringIO()) == 1
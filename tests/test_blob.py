@@ -23,3 +23,27 @@ def test_blob():
     C = pymorph.blob(F, 'centroid')
     assert np.all(C.sum(1) == 1)
 
+
+def test_blob_many():
+    np.random.seed(51)
+    F = pymorph.label(np.random.rand(30,40) > .6)
+    areas = pymorph.blob(F, 'area', 'data')
+    centroids = pymorph.blob(F, 'centroid', 'data')
+    boxes = pymorph.blob(F, 'boundingbox', 'data')
+    assert len(areas) == len(centroids) == len(boxes) == F.max()
+    for i in xrange(F.max()):
+        Y,X = np.where(F == (i+1))
+        assert areas[i] == len(Y)
+        assert tuple(centroids[i]) == (Y.sum() // len(Y), X.sum() // len(X))
+        assert tuple(boxes[i]) == (X.min(), Y.min(), X.max()+1, Y.max()+1)
+    assert np.all(pymorph.blob(F, 'area')[F > 0] == areas[F[F > 0]-1])
+    assert pymorph.blob(F, 'centroid').sum() == F.max()
+
+def test_blob_stack():
+    np.random.seed(7)
+    f = pymorph.label(np.random.rand(4,9,11) > .6)
+    for m in ('area', 'centroid', 'boundingbox'):
+        y = pymorph.blob(f, m)
+        assert np.all(y == np.array([pymorph.blob(fi, m) for fi in f]))
+        for yi,fi in zip(pymorph.blob(f, m, 'data'), f):
+            assert np.all(yi == pymorph.blob(fi, m, 'data'))
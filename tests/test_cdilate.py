@@ -0,0 +1,39 @@
+import numpy as np
+import pymorph
+
+def _cdilate_loop(f, g, Bc, n):
+    f = pymorph.intersec(f, g)
+    for i in xrange(n):
+        f = pymorph.intersec(pymorph.dilate(f, Bc), g)
+    return f
+
+def test_cdilate_frontier():
+    np.random.seed(3)
+    g = np.random.randint(0, 256, (60, 80)).astype(np.uint8)
+    f = np.zeros_like(g)
+    f[30, 40] = 255
+    for n in (1, 5, 40):
+        assert np.all(pymorph.cdilate(f, g, pymorph.sebox(), n) == _cdilate_loop(f, g, pymorph.sebox(), n))
+    gb = np.random.rand(60, 80) < .6
+    fb = np.zeros_like(gb)
+    fb[::7, ::9] = True
+    for n in (2, 30):
+        assert np.all(pymorph.cdilate(fb, gb, pymorph.secross(), n) == _cdilate_loop(fb, gb, pymorph.secross(), n))
+        expected = ~_cdilate_loop(~fb, ~gb, pymorph.secross(), n)
+        assert np.all(pymorph.cerode(fb, gb, pymorph.secross(), n) == expected)
+
+def test_gdist():
+    f = np.ones((3, 7), bool)
+    f[:2, 3] = False
+    g = np.zeros_like(f)
+    g[0, 0] = True
+    y = pymorph.gdist(f, g)
+    assert y.dtype == np.uint16
+    assert np.all(y[0] == [0, 1, 2, 65535, 8, 9, 10])
+    assert np.all(y[2] == [2, 3, 4, 5, 6, 7, 8])
+
+def test_center():
+    np.random.seed(1)
+    f = np.random.randint(0, 256, (40, 50)).astype(np.uint8)
+    y = pymorph.center(f)
+    assert np.all(pymorph.union(pymorph.intersec(y, pymorph.asf(y, 'COC')), pymorph.asf(y, 'OCO')) == y)
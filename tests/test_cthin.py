@@ -8,3 +8,13 @@ def test_cthin():
     t = pymorph.cthin(f,g)
     assert not np.any( ~g & t )
 
+
+def test_cthin_keeps_g():
+    f = np.zeros((20,20), bool)
+    f[4:16,4:16] = 1
+    g = np.zeros_like(f)
+    g[10,4:16] = 1
+    t = pymorph.cthin(f,g)
+    assert np.all(t[g])
+    assert np.all(f[t])
+    assert t.sum() < f.sum()
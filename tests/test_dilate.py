@@ -12,3 +12,63 @@ def test_dilate():
     for B in Bs:
         assert pymorph.dilate(f, B != 0).sum() == 0
         assert pymorph.dilate(f, B).sum() == 0
+
+def _dilate_pointwise(f, B):
+    # reference: maximum of the translations of f by the points of B
+    x,_ = pymorph.mat2set(B)
+    h,w = f.shape
+    y = np.zeros_like(f)
+    for dy,dx in x:
+        t = np.zeros_like(f)
+        t[max(dy,0):h+min(dy,0), max(dx,0):w+min(dx,0)] = \
+            f[max(-dy,0):h-max(dy,0), max(-dx,0):w-max(dx,0)]
+        y = np.maximum(y, t)
+    return y
+
+def test_dilate_rectangles_and_lines():
+    np.random.seed(44)
+    f = np.random.randint(0, 255, (23,31)).astype(np.uint8)
+    diagonal = np.eye(7, dtype=bool)
+    antidiagonal = diagonal[::-1]
+    offcentre = np.zeros((5,9), bool)
+    offcentre[0:2,5:9] = 1
+    for B in (pymorph.sebox(), pymorph.sebox(4), np.ones((1,11),bool), np.ones((9,1),bool),
+                diagonal, antidiagonal, offcentre, pymorph.secross(3)):
+        assert np.all(pymorph.dilate(f, B) == _dilate_pointwise(f, B))
+        assert np.all(pymorph.dilate(f > 128, B) == _dilate_pointwise(f > 128, B))
+
+def test_dilate_binary_wide():
+    # binary images are processed 64 pixels at a time: cross word boundaries
+    np.random.seed(45)
+    for w in (63, 64, 65, 200):
+        f = np.random.rand(9, w) > .9
+        for B in (pymorph.secross(), pymorph.sebox(2), np.ones((1,70),bool), np.eye(5, dtype=bool)):
+            assert np.all(pymorph.dilate(f, B) == _dilate_pointwise(f, B))
+
+def test_stack():
+    np.random.seed(5)
+    g = (np.random.rand(4,9,13)*255).astype(np.uint8)
+    for f in (g, g > 128):
+        Bs = [None, pymorph.sebox(2), pymorph.seline(3,30) > 0]
+        if f.dtype != bool:
+            Bs.append(pymorph.sedisk(2,2,'octagon',False))
+        for B in Bs:
+            for op in (pymorph.dilate, pymorph.erode, pymorph.open, pymorph.close, pymorph.gradm, pymorph.openth, pymorph.closeth):
+                y = op(f, B)
+                assert y.shape == f.shape
+                assert np.all(y == np.array([op(fi, B) for fi in f]))
+    for f in (g[:0], g[:0] > 128):
+        for op in (pymorph.dilate, pymorph.erode, pymorph.open, pymorph.gradm):
+            y = op(f, np.eye(3, dtype=bool))
+            assert y.shape == f.shape and y.dtype == f.dtype
+
+def test_stack_diagonal_large():
+    # stacks are tall: their diagonal lines are sheared along the columns
+    np.random.seed(6)
+    f = (np.random.rand(2000,20,20)*255).astype(np.uint8)
+    for B in (np.eye(5, dtype=bool), np.eye(5, dtype=bool)[::-1]):
+        assert np.all(pymorph.dilate(f, B) == np.array([pymorph.dilate(fi, B) for fi in f]))
+        assert np.all(pymorph.erode(f, B) == np.array([pymorph.erode(fi, B) for fi in f]))
+    f = (np.random.rand(300,40)*255).astype(np.uint8)
+    B = np.eye(5, dtype=bool)
+    assert np.all(pymorph.dilate(f, B) == _dilate_pointwise(f, B))
@@ -0,0 +1,33 @@
+import pymorph
+import numpy as np
+
+def _brute_dist2(f, spacing=(1,1)):
+    Y,X = np.where(~f)
+    d = np.empty(f.shape)
+    for y,x in np.ndindex(*f.shape):
+        d[y,x] = ((spacing[0]*(Y-y))**2 + (spacing[1]*(X-x))**2).min()
+    return d
+
+def test_dist_exact():
+    np.random.seed(47)
+    for i in xrange(20):
+        f = np.random.rand(13,17) > np.random.rand()
+        f[np.random.randint(13), np.random.randint(17)] = 0
+        d2 = _brute_dist2(f)
+        assert np.all(pymorph.dist(f, metric='euclidean2') == d2)
+        assert pymorph.dist(f, metric='euclidean2').dtype == np.int32
+        assert np.all(pymorph.dist(f) == np.floor(np.sqrt(d2) + .5))
+        assert np.allclose(pymorph.dist(f, dtype='float32'), np.sqrt(d2))
+
+def test_dist_spacing():
+    np.random.seed(48)
+    f = np.random.rand(11,12) > .2
+    f[0,0] = 0
+    d = pymorph.dist(f, metric='euclidean2', spacing=(2.,.5), dtype='float32')
+    assert d.dtype == np.float32
+    assert np.allclose(d, _brute_dist2(f, (2.,.5)))
+
+def test_dist_no_background():
+    f = np.ones((4,5), bool)
+    assert np.all(pymorph.dist(f) == 65535)
+    assert np.all(np.isinf(pymorph.dist(f, dtype='float32')))
@@ -20,3 +20,21 @@ def test_erode_mixed_types():
     f[3,3] = 1
     assert pymorph.erode(f,A).sum() == 1
 
+
+def test_erode_binary_wide():
+    np.random.seed(46)
+    for w in (63, 64, 65, 200):
+        f = np.random.rand(9, w) > .1
+        for B in (pymorph.secross(), pymorph.sebox(2), np.ones((1,70),bool), np.array([[1,0],[1,1]],bool)):
+            grey = pymorph.erode(f.astype(np.uint8), B)
+            assert np.all(pymorph.erode(f, B) == (grey > 0))
+
+def test_erode_dilate_out():
+    np.random.seed(4)
+    f = np.random.randint(0, 256, (20, 30)).astype(np.uint8)
+    B = pymorph.sebox()
+    for op in (pymorph.erode, pymorph.dilate):
+        expected = op(f, B)
+        g = f.copy()
+        assert op(g, B, g) is g
+        assert np.all(g == expected)
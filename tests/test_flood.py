@@ -0,0 +1,38 @@
+import pymorph
+import numpy as np
+
+def test_flood_area_h():
+    np.random.seed(51)
+    for i in xrange(20):
+        f = np.random.randint(0, 20, (8,9)).astype(np.uint8)
+        T = np.random.randint(0, 30)
+        for Bc in (pymorph.secross(), pymorph.sebox()):
+            assert np.all(pymorph.flood(f, T, 'AREA', Bc) == pymorph.areaclose(f, T, Bc))
+            assert np.all(pymorph.flood(f, T, 'h', Bc) == pymorph.hmin(f, T, Bc))
+
+def test_flood_volume():
+    f = np.array([[9, 9, 9, 9, 9, 9, 9],
+                  [9, 2, 9, 5, 5, 9, 9],
+                  [9, 9, 9, 9, 9, 9, 9]], np.uint8)
+    # the basin of 2 holds 3 at level 5, the one of 5 holds 2 at level 6
+    y = pymorph.flood(f, 3, 'VOLUME')
+    assert y.dtype == np.uint8
+    assert y[1,1] == 5
+    assert np.all(y[1,3:5] == 7)
+    assert np.all(y[f == 9] == 9)
+    assert np.all(pymorph.flood(f, 0, 'VOLUME') == f)
+    assert np.all(pymorph.flood(f, 10**6, 'VOLUME') == 255)
+
+def test_flood_dynamics():
+    f = np.array([[9, 9, 9, 9, 9, 9, 9],
+                  [9, 2, 7, 5, 5, 9, 0],
+                  [9, 9, 9, 9, 9, 9, 9]], np.uint8)
+    expected = np.zeros(f.shape, np.uint8)
+    expected[1,3:5] = 2
+    expected[1,1] = 7
+    expected[1,6] = 9
+    assert np.all(pymorph.flood(f, -1, 'H') == expected)
+    expected[1,3:5] = 2
+    expected[1,1] = 4
+    expected[1,6] = f.size
+    assert np.all(pymorph.flood(f, -1, 'AREA') == expected)
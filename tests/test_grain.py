@@ -62,3 +62,19 @@ def test_off_by_one():
             ])
     assert((maxdata == pymorph.grain(D,L,'max', 'data')).all())
     assert((maximage == pymorph.grain(D,L,'max', 'image')).all())
+
+def test_median_std1():
+    np.random.seed(52)
+    L = pymorph.label(np.random.rand(20,30) > .5)
+    f = np.random.randint(0, 200, L.shape).astype(np.uint8)
+    median = pymorph.grain(f, L, 'median', 'data')
+    std1 = pymorph.grain(f, L, 'std1', 'data')
+    image = pymorph.grain(f, L, 'median')
+    for i in xrange(L.max()):
+        pixels = f[L == (i+1)]
+        assert median[i] == np.median(pixels)
+        assert np.all(image[L == (i+1)] == median[i])
+        if len(pixels) > 1:
+            assert np.allclose(std1[i], pixels.std(ddof=1))
+        else:
+            assert std1[i] == 0
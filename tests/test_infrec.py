@@ -0,0 +1,47 @@
+import numpy as np
+import pymorph
+np.random.seed(123)
+
+def _iterated(f, g, Bc, op):
+    # cdilate/cerode take the iterative path when n < f.size
+    return op(f, g, Bc, f.size - 1)
+
+def test_infrec_random():
+    for Bc in (pymorph.secross(), pymorph.sebox()):
+        g = np.random.randint(0, 40, (32,27)).astype(np.uint8)
+        f = (g * (np.random.rand(32,27) > .9)).astype(np.uint8)
+        assert np.all(pymorph.infrec(f, g, Bc) == _iterated(f, g, Bc, pymorph.cdilate))
+
+def test_suprec_random():
+    for Bc in (pymorph.secross(), pymorph.sebox()):
+        g = np.random.randint(0, 40, (25,31)).astype(np.uint8)
+        f = np.where(np.random.rand(25,31) > .9, g, 255).astype(np.uint8)
+        assert np.all(pymorph.suprec(f, g, Bc) == _iterated(f, g, Bc, pymorph.cerode))
+
+def test_infrec_binary_spiral():
+    g = np.zeros((21,21), bool)
+    g[::4] = True
+    g[:,0] = True
+    g[:,-1] = True
+    f = np.zeros_like(g)
+    f[0,0] = True
+    y = pymorph.infrec(f, g)
+    assert y.dtype == bool
+    assert np.all(y == g)
+
+def test_suprec_mixed_types():
+    # g is taken in the type of f (clipped), as in infrec
+    f = np.empty((5,6), np.uint8)
+    f.fill(20)
+    for g in (np.zeros((5,6), bool), np.empty((5,6), np.int32)):
+        g.fill(-5)
+        assert np.all(pymorph.suprec(f, g) == 20)
+        assert np.all(pymorph.cerode(f, g, None, 100) == 20)
+        assert np.all(pymorph.cerode(f, g, None, 1) == 20)
+    np.random.seed(12)
+    f = np.random.randint(0, 256, (9,8)).astype(np.uint8)
+    g = np.random.randint(-300, 600, (9,8)).astype(np.int32)
+    gc = np.clip(g, 0, 255).astype(np.uint8)
+    assert np.all(pymorph.suprec(f, g) == pymorph.suprec(f, gc))
+    assert np.all(pymorph.cerode(f, g, None, 100) == pymorph.cerode(f, gc, None, 100))
+    assert np.all(pymorph.cerode(f, g, None, 3) == pymorph.cerode(f, gc, None, 3))
@@ -0,0 +1,64 @@
+import numpy as np
+import pymorph
+
+def test_label_order():
+    f = pymorph.binary([
+            [0,0,1,1,0,1],
+            [1,0,0,1,0,1],
+            [1,1,0,0,0,0],
+            [0,0,1,0,1,1]])
+    assert np.all(pymorph.label(f) == np.array([
+            [0,0,1,1,0,2],
+            [3,0,0,1,0,2],
+            [3,3,0,0,0,0],
+            [0,0,4,0,5,5]]))
+    assert np.all(pymorph.label(f, pymorph.sebox()) == np.array([
+            [0,0,1,1,0,2],
+            [3,0,0,1,0,2],
+            [3,3,0,0,0,0],
+            [0,0,3,0,4,4]]))
+
+def test_label_large_se():
+    f = np.zeros((9,9), bool)
+    f[1,1] = 1
+    f[1,3] = 1
+    f[7,7] = 1
+    labeled = pymorph.label(f, pymorph.sebox(2))
+    assert labeled.shape == f.shape
+    assert labeled.max() == 2
+    assert labeled[1,1] == labeled[1,3]
+
+def test_label_empty():
+    f = np.zeros((4,5), bool)
+    assert pymorph.label(f).max() == 0
+
+def test_label_stack():
+    np.random.seed(6)
+    f = np.random.rand(5,10,12) > .6
+    f[2] = 0
+    for Bc in (None, pymorph.sebox()):
+        y = pymorph.label(f, Bc)
+        assert y.dtype == np.uint16
+        assert np.all(y == np.array([pymorph.label(fi, Bc) for fi in f]))
+    y = pymorph.label(np.zeros((0,10,12), bool))
+    assert y.shape == (0,10,12) and y.dtype == np.uint16
+
+def _rounds(monkeypatch, op, *args):
+    from pymorph import mmorph
+    compress = mmorph._uf_compress
+    count = []
+    def counting(parent):
+        count.append(1)
+        return compress(parent)
+    monkeypatch.setattr(mmorph, '_uf_compress', counting)
+    y = op(*args)
+    return y, len(count)
+
+def test_label_comb(monkeypatch):
+    # teeth joined by the last row: a chain of merges between the columns
+    f = np.zeros((400,400), bool)
+    f[:,::2] = True
+    f[-1] = True
+    y, rounds = _rounds(monkeypatch, pymorph.label, f)
+    assert y.max() == 1 and np.all(y[f] == 1)
+    assert rounds < 10
@@ -2,5 +2,35 @@ import numpy as np
 import pymorph
 
 def test_labelflat():
-    assert np.all(pymorph.labelflat(pymorph.secross()) == pymorph.secross())
+    B = pymorph.secross()
+    L = pymorph.labelflat(B)
+    # the cross and the four corners
+    assert L.max() == 5
+    assert L.min() == 1
+    assert np.all(L[B] == L[1,1])
+    assert len(set(L[~B])) == 4
 
+def test_labelflat_lambda():
+    f = np.array([
+        [5,5,8,3,0],
+        [5,8,8,0,2]], np.uint8)
+    assert np.all(pymorph.labelflat(f) == [[1,1,2,3,4],[1,2,2,5,6]])
+    assert np.all(pymorph.labelflat(f, pymorph.secross(), 2) == [[1,1,2,3,4],[1,2,2,4,4]])
+    assert pymorph.labelflat(f, pymorph.secross(), 3).max() == 2
+    assert pymorph.labelflat(f, pymorph.secross(), 5).max() == 1
+
+def test_labelflat_comb(monkeypatch):
+    from pymorph import mmorph
+    compress = mmorph._uf_compress
+    count = []
+    def counting(parent):
+        count.append(1)
+        return compress(parent)
+    monkeypatch.setattr(mmorph, '_uf_compress', counting)
+    f = np.zeros((400,400), np.uint8)
+    f[:,::2] = 5
+    f[-1] = 5
+    y = pymorph.labelflat(f)
+    assert y.max() == 1 + 200
+    assert len(np.unique(y[f == 5])) == 1
+    assert len(count) < 10
@@ -2,3 +2,14 @@ import pymorph
 def test_neg():
     pymorph.neg(pymorph.secross()) == ~pymorph.secross()
 
+
+def test_neg_out():
+    import numpy as np
+    f = np.array([0, 3, 255], np.uint8)
+    assert np.all(pymorph.neg(f) == [255, 252, 0])
+    pymorph.neg(f, f)
+    assert np.all(f == [255, 252, 0])
+    g = np.array([-5, 0, 7], np.int32)
+    y = np.empty_like(g)
+    assert pymorph.neg(g, y) is y
+    assert np.all(y == [5, 0, -7])
@@ -35,3 +35,40 @@ def test_all_types():
     Buser = np.ones((3,3),bool)
     Buser[2,2] = 0
     yield test_type, 'user', Buser
+
+def test_disks():
+    np.random.seed(5)
+    f = np.random.rand(30,40) > .2
+    f[10:28,5:30] = True
+    for type in ('octagon', 'chessboard', 'city-block'):
+        for n in (65535, 4):
+            y = np.zeros(f.shape, int)
+            for k in xrange(min(n, 30)):
+                y += pymorph.open(f, pymorph.sedisk(k, 2, type))
+            ot = pymorph.opentransf(f, type, n)
+            assert ot.dtype == np.uint8
+            assert np.all(ot == y)
+
+def test_large():
+    # the opening of a full image is the image, for any disk
+    f = np.ones((300,320), bool)
+    ot = pymorph.opentransf(f, 'chessboard')
+    assert ot.dtype == np.uint16
+    assert np.all(ot == 300)
+
+def test_lines():
+    np.random.seed(6)
+    f = np.random.rand(12,17) > .25
+    se = {
+        'linear-h': pymorph.binary([[1,1,1]]),
+        'linear-v': pymorph.binary([[1],[1],[1]]),
+        'linear-45r': pymorph.binary([[0,0,1],[0,1,0],[1,0,0]]),
+        'linear-45l': pymorph.binary([[1,0,0],[0,1,0],[0,0,1]]),
+    }
+    for type,B in se.items():
+        for n in (65535, 3):
+            y = np.zeros(f.shape, int)
+            # at most the length of the lines
+            for k in xrange(min(n, (17 if type == 'linear-h' else 12))):
+                y += pymorph.open(f, pymorph.sesum(B, k))
+            assert np.all(pymorph.opentransf(f, type, n) == y)
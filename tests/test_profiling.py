@@ -0,0 +1,50 @@
+import numpy as np
+from StringIO import StringIO
+import pymorph
+from pymorph import mmorph, profiling
+
+def test_profile():
+    np.random.seed(4)
+    f = (np.random.rand(40,50)*255).astype(np.uint8)
+    g = np.ones(f.shape, bool)
+    marker = np.zeros(f.shape, bool)
+    marker[0,0] = True
+    dilate = pymorph.dilate
+    with profiling.profile() as p:
+        assert profiling.active() is p
+        assert pymorph.dilate is not dilate
+        assert mmorph.dilate is pymorph.dilate
+        y = pymorph.open(f, pymorph.sebox())
+        c = pymorph.cdilate(marker, g, None, 5)
+        t = pymorph.tiled(pymorph.open, f, (pymorph.sebox(),), tile=16, workers=2)
+    assert profiling.active() is None
+    assert pymorph.dilate is dilate
+    assert mmorph.dilate is dilate
+    assert mmorph._iterations_hook is None
+    assert np.all(y == pymorph.open(f, pymorph.sebox()))
+    assert np.all(c == pymorph.cdilate(marker, g, None, 5))
+    assert np.all(t == y)
+
+    S = p.stats()
+    assert S['tiled']['calls'] == 1
+    assert S['open']['calls'] == 1 + 3*4
+    assert S['cdilate']['calls'] == 1
+    assert S['cdilate']['pixels'] == f.size
+    assert S['cdilate']['iterations'] == 5
+    assert S['dilate']['calls'] >= S['open']['calls']
+    for s in S.values():
+        assert 0 <= s['self'] <= s['time'] + 1e-9
+        # the memory is not measured by default
+        assert s['peak_bytes'] == 0
+    out = StringIO()
+    p.report(out, limit=3)
+    assert len(out.getvalue().splitlines()) == 4
+
+def test_profile_memory():
+    f = np.zeros((300,300), np.uint8)
+    with profiling.profile(memory=True) as p:
+        assert p.memory
+        pymorph.open(f, pymorph.sebox())
+    S = p.stats()
+    assert S['open']['calls'] == 1
+    assert S['open']['peak_bytes'] >= 0
@@ -10,3 +10,24 @@ def test_sedisk():
     Y -= h//2
     assert np.all( X**2+Y**2 > (w//2)**2 )
 
+
+def test_sedisk_octagon():
+    for flat in (True, False):
+        b1 = pymorph.sebox()
+        b2 = pymorph.secross()
+        if not flat:
+            b1 = pymorph.to_int32(np.ones((3,3)))
+            b2 = pymorph.to_int32([[-2147483647,0,-2147483647],[0,1,0],[-2147483647,0,-2147483647]])
+        B = pymorph.sedilate(b1, b2)
+        if not flat:
+            B = pymorph.sedilate(B, pymorph.to_int32([[2]]))
+        for r in xrange(2, 12):
+            se = pymorph.sedisk(r, 2, 'octagon', flat, 2)
+            assert se.shape == B.shape and np.all(se == B)
+            B = pymorph.sedilate(B, (b1 if r % 2 else b2))
+
+def test_sedisk_octagon_large():
+    pymorph.mmorph._se_cache.clear()
+    se = pymorph.sedisk(401, 2, 'octagon')
+    assert se.shape == (803, 803)
+    assert se[401].all() and not se[0,0]
@@ -7,7 +7,7 @@ def _brute_test(se):
 def test_sereflect():
     yield _brute_test, pymorph.secross()
 
-    se = pymorph.secross()
+    se = pymorph.secross().copy()
     se[1,1] = 1 # This makes it non-symmetric
     yield _brute_test, se
 
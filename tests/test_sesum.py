@@ -5,3 +5,49 @@ def test_sesum():
     assert np.all(pymorph.sesum(pymorph.secross(), 1) == pymorph.secross())
     assert len(pymorph.sesum(pymorph.secross(), 0).shape) == 2
 
+
+def test_sesum_incremental():
+    B = pymorph.sebox()
+    B5 = pymorph.sesum(B, 5)
+    B3 = pymorph.sesum(B, 3)
+    assert B5.shape == (11,11) and B5.all()
+    assert np.all(pymorph.sesum(B3, 2) == pymorph.sesum(B, 6))
+    assert pymorph.sesum(B, 5) is B5
+
+def test_se_readonly():
+    for B in (pymorph.secross(), pymorph.sebox(2), pymorph.sedisk(3), pymorph.seline(4, 45), pymorph.serot(pymorph.seline(3))):
+        try:
+            B[0,0] = 0
+        except ValueError:
+            pass
+        else:
+            assert False, 'structuring elements should be read-only'
+    B = pymorph.secross().copy()
+    B[0,0] = 1
+    assert not pymorph.secross()[0,0]
+
+def test_sesum_threads():
+    import threading
+    B = pymorph.binary([[1,1,0]])
+    expected = [pymorph.sesum(B, n).copy() for n in xrange(12)]
+    errors = []
+    def work(seed):
+        r = np.random.RandomState(seed)
+        try:
+            for i in xrange(500):
+                if r.rand() < .05: pymorph.mmorph._se_cache.clear()
+                n = r.randint(12)
+                y = pymorph.sesum(B, n)
+                if y.shape != expected[n].shape or np.any(y != expected[n]):
+                    errors.append(n)
+        except Exception, e:
+            errors.append(e)
+    size = pymorph.mmorph._se_cache_size
+    pymorph.mmorph._se_cache_size = 4
+    try:
+        threads = [threading.Thread(target=work, args=(s,)) for s in xrange(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    finally:
+        pymorph.mmorph._se_cache_size = size
+    assert not errors
@@ -5,3 +5,32 @@ def test_smoke_skelm():
     f[3:6, 4:7] = True
     f[4] = True
     assert pymorph.skelm(f).shape == f.shape
+
+def test_skelm_definition():
+    np.random.seed(7)
+    f = np.random.rand(20,25) > .15
+    f[5:15,3:20] = True
+    for B in (pymorph.secross(), pymorph.sebox(), pymorph.binary([[0,1,1]])):
+        y = np.zeros(f.shape, np.uint16)
+        nb = pymorph.sesum(B, 0)
+        for r in xrange(1, 50):
+            e = pymorph.erode(f, nb)
+            y[e & ~pymorph.open(e, B)] = r
+            nb = pymorph.sedilate(nb, B)
+        assert np.all(pymorph.skelm(f, B, return_binary=False) == y)
+        assert np.all(pymorph.skelm(f, B) == (y > 0))
+
+def test_skelm_full():
+    assert not pymorph.skelm(np.ones((6,7), bool)).any()
+
+def test_skelmrec_large():
+    np.random.seed(8)
+    f = np.zeros((30,40), np.uint16)
+    f[np.random.rand(30,40) < .01] = 45
+    f[3,5] = 60
+    f[20,30] = 2
+    for B in (pymorph.secross(), pymorph.sebox()):
+        y = np.zeros(f.shape, bool)
+        for r in xrange(f.max(), 1, -1):
+            y = pymorph.dilate(y | (f >= r), B)
+        assert np.all(pymorph.skelmrec(f, B) == (y | (f > 0)))
@@ -9,3 +9,13 @@ def test_subm():
     assert not np.any( pymorph.subm(np.ones((3,3), np.uint8), np.ones((3,3), np.bool)) )
     assert not np.any( pymorph.subm(np.ones((3,3), np.uint8), 2+np.ones((3,3), np.uint8)) )
     assert np.all(pymorph.subm(np.ones((3,3), np.uint8), 2+np.ones((3,3), np.uint8))  == 0)
+
+def test_subm_out():
+    f = np.array([0, 100, 200], np.uint8)
+    g = np.array([50, 50, 50], np.uint8)
+    assert np.all(pymorph.subm(f, g) == [0, 50, 150])
+    assert np.all(pymorph.subm(f, -100) == [100, 200, 255])
+    pymorph.subm(f, g, g)
+    assert np.all(g == [0, 50, 150])
+    pymorph.subm(f, 30, f)
+    assert np.all(f == [0, 70, 170])
@@ -19,3 +19,34 @@ def test_supcanon():
     g = mmorph.supcanon(f,i, 180)
     assert np.all((f|g) == f)
 
+
+def test_canon_rotations():
+    np.random.seed(3)
+    g = np.random.rand(20,70) < .5
+    for Iab in (mmorph.homothin(), mmorph.endpoints()):
+        for theta in (45, 90):
+            for d in ('clockwise', 'anti-clockwise'):
+                sup = np.zeros(g.shape, bool)
+                inf = np.ones(g.shape, bool)
+                for t in xrange(0, 360, theta):
+                    Irot = mmorph.interot(Iab, t, d)
+                    sup |= mmorph.supgen(g, Irot)
+                    inf &= mmorph.infgen(g, Irot)
+                assert np.all(mmorph.supcanon(g, Iab, theta, d) == sup)
+                assert np.all(mmorph.infcanon(g, Iab, theta, d) == inf)
+
+
+def test_union_intersec_out():
+    a = np.array([1, 5, 9], np.uint8)
+    b = np.array([4, 4, 4], np.uint8)
+    c = np.array([2, 6, 3], np.uint8)
+    y = np.empty_like(a)
+    assert mmorph.union(a, b, c, out=y) is y
+    assert np.all(y == [4, 6, 9])
+    mmorph.intersec(a, b, c, out=c)
+    assert np.all(c == [1, 4, 3])
+    mmorph.union(a, 7, out=a)
+    assert np.all(a == [7, 7, 9])
+    g = f.copy()
+    mmorph.intersec(g, ~f, out=g)
+    assert not g.any()
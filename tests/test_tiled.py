@@ -0,0 +1,81 @@
+import numpy as np
+import pymorph
+from pymorph import mmorph
+
+def _check(op, f, args=(), kwargs={}, **opts):
+    y = op(f, *args, **kwargs)
+    t = pymorph.tiled(op, f, args, kwargs, **opts)
+    assert t.dtype == y.dtype
+    assert np.all(t == y)
+
+def test_tiled():
+    np.random.seed(2)
+    f = (np.random.rand(61,83)*255).astype(np.uint8)
+    b = f > 128
+    for g in (f, b):
+        _check(pymorph.dilate, g, (pymorph.sedisk(2),), tile=(16,9), workers=3)
+        _check(pymorph.erode, g, (pymorph.seline(4,30) > 0,), tile=13, workers=2)
+        _check(pymorph.open, g, tile=10, workers=1)
+        _check(pymorph.close, g, (pymorph.sebox(),), tile=(7,20), workers=2)
+        _check(pymorph.gradm, g, (pymorph.sebox(), pymorph.secross(2)), tile=12, workers=2)
+        _check(pymorph.openth, g, kwargs={'b':pymorph.sebox()}, tile=15, workers=2)
+        _check(pymorph.closeth, g, tile=15, workers=2)
+        _check(pymorph.asf, g, ('OCO', pymorph.secross(), 2), tile=20, workers=2)
+    _check(pymorph.supgen, b, (pymorph.endpoints(),), tile=(8,70), workers=2)
+    _check(pymorph.toggle, f, (f//2, f//2+100), tile=11, workers=2)
+
+def test_tiled_threads_cold_cache():
+    # the threads build the same structuring elements at once
+    np.random.seed(3)
+    f = (np.random.rand(30,40)*255).astype(np.uint8)
+    y = pymorph.asf(f, 'OC', pymorph.secross(), 3)
+    z = pymorph.open(f, pymorph.sedisk(3))
+    for i in xrange(5):
+        mmorph._se_cache.clear()
+        assert np.all(pymorph.tiled(pymorph.asf, f, ('OC', pymorph.secross(), 3), tile=(3,3), workers=8) == y)
+        mmorph._se_cache.clear()
+        assert np.all(pymorph.tiled(pymorph.open, f, (pymorph.sedisk(3),), tile=4, workers=8) == z)
+
+def test_tiled_processes():
+    np.random.seed(3)
+    f = (np.random.rand(40,50)*255).astype(np.uint8)
+    _check(pymorph.open, f, (pymorph.sedisk(3),), tile=16, workers=2, processes=True)
+
+def test_tiled_halo():
+    f = np.zeros((10,10), np.uint8)
+    try:
+        pymorph.tiled(pymorph.label, f > 0, tile=4)
+    except ValueError:
+        pass
+    else:
+        assert False, 'tiled should require a halo for unknown operators'
+    _check(pymorph.label, f > 0, tile=4, halo=0)
+
+class _Bands(object):
+    '''Image source that records the largest slice it is asked for'''
+    def __init__(self, f):
+        self.f = f
+        self.shape = f.shape
+        self.rows = 0
+    def __getitem__(self, index):
+        t = self.f[index]
+        self.rows = max(self.rows, t.shape[0])
+        return t.copy()
+
+def test_tiled_stream(tmpdir):
+    np.random.seed(4)
+    f = (np.random.rand(90,40)*255).astype(np.uint8)
+    src = np.memmap(str(tmpdir.join('f.raw')), np.uint8, 'w+', shape=f.shape)
+    src[:] = f
+    out = np.memmap(str(tmpdir.join('y.raw')), np.uint8, 'w+', shape=f.shape)
+    chain = [(pymorph.erode, (pymorph.sebox(),)), (pymorph.open, (pymorph.sedisk(2),)), pymorph.gradm]
+    expected = pymorph.gradm(pymorph.open(pymorph.erode(f, pymorph.sebox()), pymorph.sedisk(2)))
+    assert pymorph.tiled(chain, src, tile=(8,None), out=out) is out
+    assert np.all(out == expected)
+    bands = _Bands(f)
+    y = pymorph.tiled(chain, bands, tile=(8,None), workers=2)
+    assert np.all(y == expected)
+    assert bands.rows == 8 + 2*(1+4+1)
+    lo, hi = f//3, f//3+120
+    y = pymorph.tiled([(pymorph.dilate,), (pymorph.toggle, (lo, hi))], f, tile=(5,None), workers=2)
+    assert np.all(y == pymorph.toggle(pymorph.dilate(f), lo, hi))
@@ -58,3 +58,24 @@ def test_watershed():
                [2, 2, 2, 2],
                [2, 2, 2, 2],
                [2, 2, 2, 2]]))
+
+def test_cwatershed_dtypes():
+    S = np.array([
+        [0,0,0,0],
+        [0,1,2,1],
+        [1,1,1,1],
+        [0,0,1,0],
+        [1,1,1,1],
+        [1,2,2,1],
+        [1,1,2,2]
+        ])
+    M = np.zeros(S.shape, np.uint16)
+    M[1,2] = 1
+    M[5,1] = 2
+    W = pymorph.cwatershed((2-S).astype(np.uint8), M)
+    for dtype in (np.uint16, np.int32):
+        W2,L = pymorph.cwatershed((2-S).astype(dtype), M, return_lines=True)
+        assert np.all(W == W2)
+        assert W2.dtype == M.dtype
+        assert L.dtype == bool
+        assert L.any()